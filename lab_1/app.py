@@ -4,23 +4,33 @@ import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
 
+from lab_1.app.utils.binned_kde import binned_kde, kdeplot_binned
+from lab_1.app.utils.binned_plots import (
+    BINNED_THRESHOLD, binned_jointplot, binned_pairplot, binned_scatter, use_binned
+)
+from lab_1.app.utils.column_stats import QUANTILES, load_column_stats
+from lab_1.app.utils.figure_cache import FigureCache
+from lab_1.app.utils.fingerprint import file_fingerprint
+
 # Настройка стиля
 sns.set_theme(style="whitegrid")
 
 
-# Загрузка данных
-@st.cache_data
-def load_data():
-    df = pd.read_csv('utils/data/optimized_sakila.csv')
-    return df
+# Загрузка данных (parquet хранит типы из оптимизатора, читаем только нужные столбцы)
+DATA_PATH = 'utils/data/optimized_sakila_pg.parquet'
+APP_COLUMNS = ['rental_duration', 'rental_rate', 'length', 'replacement_cost', 'amount', 'category', 'rating']
 
 
-df = load_data()
+# fingerprint в аргументах - чтобы кэш сбрасывался, когда файл датасета перезаписан
+@st.cache_data
+def load_data(fingerprint: str):
+    df = pd.read_parquet(DATA_PATH, columns=APP_COLUMNS)
+    return df
 
 
 # Функция для получения числовых столбцов без айди
 def get_numeric_columns(df):
-    numeric_columns = df.select_dtypes(include=["int64", "float64"]).columns
+    numeric_columns = df.select_dtypes(include="number").columns
     meaningful_numeric = [
         col for col in numeric_columns
         if not col.lower().endswith("_id") and col.lower() != "id"
@@ -28,6 +38,30 @@ def get_numeric_columns(df):
     return meaningful_numeric
 
 
+# Статистика по столбцам считается один раз на версию датасета и лежит в sidecar-файле
+@st.cache_data
+def load_stats(fingerprint: str):
+    data = load_data(fingerprint)
+    return load_column_stats(DATA_PATH, data, get_numeric_columns(data))
+
+
+# Готовые картинки графиков: один кэш на процесс, общий для всех пользователей
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache(max_items=64, cache_dir='utils/data/figure_cache')
+
+
+def show_figure(page: str, chart: str, column, draw):
+    # matplotlib вызывается только если такой график для этой версии датасета еще не рисовали
+    png = get_figure_cache().render((page, chart, column, fingerprint), draw)
+    st.image(png, width="stretch")
+
+
+fingerprint = file_fingerprint(DATA_PATH)
+df = load_data(fingerprint)
+stats = load_stats(fingerprint)
+
+
 # Основной интерфейс
 st.set_page_config(layout="wide", page_title="Sakila Data Analysis")
 
@@ -49,64 +83,82 @@ if page == "Одномерный анализ":
 
     if selected_column:
         st.subheader(f"Анализ столбца: {selected_column}")
+        column_stats = stats['columns'][selected_column]
+        # у столбца из одних пропусков статистика урезана (count, missing, nunique) - рисовать нечего
+        if column_stats['count'] == 0:
+            st.warning(f"В столбце нет значений, пропусков: {column_stats['missing']}")
+            st.stop()
 
         # Статистика
         col1, col2 = st.columns(2)
 
         with col1:
             st.markdown("### 📈 Основная статистика")
-            stats_df = df[selected_column].describe()
+            stats_df = pd.Series(column_stats['describe'], name=selected_column)
             st.dataframe(stats_df)
 
             # Дополнительная информация
             st.markdown("### ℹ️ Дополнительная информация")
-            st.write(f"**Количество значений:** {df[selected_column].count()}")
-            st.write(f"**Количество пропусков:** {df[selected_column].isnull().sum()}")
-            st.write(f"**Уникальных значений:** {df[selected_column].nunique()}")
+            st.write(f"**Количество значений:** {column_stats['count']}")
+            st.write(f"**Количество пропусков:** {column_stats['missing']}")
+            st.write(f"**Уникальных значений:** {column_stats['nunique']}")
 
             # Статистика по квантилям
             st.markdown("### 📊 Квантили")
-            quantiles = df[selected_column].quantile([0.25, 0.5, 0.75, 0.9, 0.95, 0.99])
+            quantiles = pd.Series(column_stats['quantiles'], index=QUANTILES, name=selected_column)
             st.dataframe(quantiles)
 
         with col2:
             # Гистограмма
             st.markdown("### 📊 Гистограмма распределения")
 
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.histplot(
-                data=df,
-                x=selected_column,
-                bins=30,
-                kde=True,
-                ax=ax,
-                color='skyblue',
-                edgecolor='black'
-            )
-            ax.set_xlabel(selected_column, fontsize=12, fontweight='bold')
-            ax.set_ylabel('Частота', fontsize=12, fontweight='bold')
-            ax.set_title(f'Распределение {selected_column}', fontsize=14, fontweight='bold')
-            ax.grid(True, alpha=0.3)
+            def draw_histogram():
+                counts = np.array(column_stats['hist_counts'])
+                edges = np.array(column_stats['hist_edges'])
 
-            st.pyplot(fig)
+                fig, ax = plt.subplots(figsize=(10, 6))
+                ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color='skyblue', edgecolor='black')
+
+                # KDE по мелкой гистограмме из sidecar, в масштабе гистограммы (как histplot(kde=True))
+                kde = binned_kde(column_stats['kde_counts'], column_stats['kde_edges'],
+                                 std=column_stats['describe']['std'])
+                if kde is not None:
+                    grid, density = kde
+                    ax.plot(grid, density * column_stats['count'] * np.diff(edges)[0], color='skyblue')
+
+                ax.set_xlabel(selected_column, fontsize=12, fontweight='bold')
+                ax.set_ylabel('Частота', fontsize=12, fontweight='bold')
+                ax.set_title(f'Распределение {selected_column}', fontsize=14, fontweight='bold')
+                ax.grid(True, alpha=0.3)
+                return fig
+
+            show_figure("univariate", "histogram", selected_column, draw_histogram)
 
             # Box plot
             st.markdown("### 📦 Box Plot")
-            fig2, ax2 = plt.subplots(figsize=(10, 4))
-            sns.boxplot(data=df, x=selected_column, ax=ax2, color='lightgreen')
-            ax2.set_xlabel(selected_column, fontsize=12, fontweight='bold')
-            ax2.set_title('Box Plot распределения', fontsize=14, fontweight='bold')
-            st.pyplot(fig2)
+
+            def draw_boxplot():
+                fig2, ax2 = plt.subplots(figsize=(10, 4))
+                ax2.bxp([{
+                    'med': column_stats['describe']['50%'],
+                    'q1': column_stats['describe']['25%'],
+                    'q3': column_stats['describe']['75%'],
+                    'whislo': column_stats['whislo'],
+                    'whishi': column_stats['whishi'],
+                    'fliers': column_stats['fliers'],
+                }], orientation='horizontal', patch_artist=True, boxprops={'facecolor': 'lightgreen'})
+                ax2.set_yticks([])
+                ax2.set_xlabel(selected_column, fontsize=12, fontweight='bold')
+                ax2.set_title('Box Plot распределения', fontsize=14, fontweight='bold')
+                return fig2
+
+            show_figure("univariate", "boxplot", selected_column, draw_boxplot)
 
         # Анализ выбросов
         st.markdown("### ⚠️ Анализ выбросов")
-        Q1 = df[selected_column].quantile(0.25)
-        Q3 = df[selected_column].quantile(0.75)
-        IQR = Q3 - Q1
-        lower_bound = Q1 - 1.5 * IQR
-        upper_bound = Q3 + 1.5 * IQR
-
-        outliers = df[(df[selected_column] < lower_bound) | (df[selected_column] > upper_bound)]
+        lower_bound = column_stats['lower_bound']
+        upper_bound = column_stats['upper_bound']
+        n_outliers = column_stats['n_outliers']
 
         col3, col4 = st.columns(2)
 
@@ -115,13 +167,14 @@ if page == "Одномерный анализ":
             st.write(f"**Верхняя граница (Q3 + 1.5*IQR):** {upper_bound:.2f}")
 
         with col4:
-            st.write(f"**Количество выбросов:** {len(outliers)}")
-            st.write(f"**Процент выбросов:** {(len(outliers) / len(df) * 100):.2f}%")
+            st.write(f"**Количество выбросов:** {n_outliers}")
+            st.write(f"**Процент выбросов:** {(n_outliers / stats['n_rows'] * 100):.2f}%")
 
         # Отображение выбросов
-        if len(outliers) > 0:
+        if n_outliers > 0:
             with st.expander("Показать выбросы"):
-                st.dataframe(outliers[[selected_column]].head(20))
+                outliers = pd.DataFrame(column_stats['outliers_head'], columns=['index', selected_column])
+                st.dataframe(outliers.set_index('index'))
 
 elif page == "Многомерный анализ":
     st.title("📈 Многомерный анализ данных")
@@ -141,22 +194,34 @@ elif page == "Многомерный анализ":
     - **Цвета:** Теплые цвета (красный) - положительная корреляция, холодные (синий) - отрицательная
     """)
 
-    meaningful_numeric = get_numeric_columns(df)
-    corr_df = df[meaningful_numeric].corr()
-
-    fig1, ax1 = plt.subplots(figsize=(12, 10))
-    sns.heatmap(
-        corr_df,
-        annot=True,
-        cmap="coolwarm",
-        fmt=".2f",
-        ax=ax1,
-        square=True,
-        cbar_kws={"label": "Коэффициент корреляции"}
+    # на больших таблицах графики 2, 3 и 5 рисуются по сеткам плотности, а не по каждой точке
+    binned_threshold = st.sidebar.number_input(
+        "Порог строк для агрегированных графиков",
+        min_value=0,
+        value=BINNED_THRESHOLD,
+        step=50_000
     )
-    ax1.set_title("Корреляционная матрица Пирсона", fontsize=16, fontweight='bold', pad=20)
-    plt.tight_layout()
-    st.pyplot(fig1)
+    binned = use_binned(df, binned_threshold)
+
+    def draw_correlation():
+        meaningful_numeric = get_numeric_columns(df)
+        corr_df = df[meaningful_numeric].corr()
+
+        fig1, ax1 = plt.subplots(figsize=(12, 10))
+        sns.heatmap(
+            corr_df,
+            annot=True,
+            cmap="coolwarm",
+            fmt=".2f",
+            ax=ax1,
+            square=True,
+            cbar_kws={"label": "Коэффициент корреляции"}
+        )
+        ax1.set_title("Корреляционная матрица Пирсона", fontsize=16, fontweight='bold', pad=20)
+        plt.tight_layout()
+        return fig1
+
+    show_figure("multivariate", "correlation", None, draw_correlation)
 
     # График 2: Парные графики
     st.subheader("2️⃣ Парные графики распределений")
@@ -169,16 +234,19 @@ elif page == "Многомерный анализ":
 
     features_columns = ["amount", "replacement_cost"]
 
-    fig2, ax2 = plt.subplots(figsize=(10, 8))
-    pairplot = sns.pairplot(
-        df[features_columns],
-        diag_kind="kde",
-        corner=True,
-        plot_kws={'alpha': 0.6},
-        diag_kws={'fill': True}
-    )
-    pairplot.fig.suptitle("Парные графики распределений", y=1.02, fontsize=16, fontweight='bold')
-    st.pyplot(pairplot.fig)
+    def draw_pairplot():
+        if binned:
+            pairplot_fig = binned_pairplot(df, features_columns)
+        else:
+            # диагональ - KDE через FFT по гистограмме, а не по каждой строке
+            pairplot = sns.PairGrid(df[features_columns], corner=True)
+            pairplot.map_lower(sns.scatterplot, alpha=0.6)
+            pairplot.map_diag(kdeplot_binned, fill=True)
+            pairplot_fig = pairplot.fig
+        pairplot_fig.suptitle("Парные графики распределений", y=1.02, fontsize=16, fontweight='bold')
+        return pairplot_fig
+
+    show_figure("multivariate", "pairplot-binned" if binned else "pairplot", None, draw_pairplot)
 
     # График 3: Совместный график
     st.subheader("3️⃣ Совместный график (amount vs replacement_cost)")
@@ -189,20 +257,26 @@ elif page == "Многомерный анализ":
     - **Отсутствие наклона:** Слабая или отсутствующая корреляция между признаками
     """)
 
-    fig3, ax3 = plt.subplots(figsize=(10, 8))
-    jointplot = sns.jointplot(
-        data=df,
-        x="amount",
-        y="replacement_cost",
-        kind="hex",
-        height=8,
-        ratio=4,
-        marginal_kws={'fill': True}
-    )
-    jointplot.ax_joint.set_xlabel('Сумма платежа ($)', fontsize=12, fontweight='bold')
-    jointplot.ax_joint.set_ylabel('Стоимость замены ($)', fontsize=12, fontweight='bold')
-    jointplot.fig.suptitle('Совместное распределение', y=1.02, fontsize=16, fontweight='bold')
-    st.pyplot(jointplot.fig)
+    def draw_jointplot():
+        if binned:
+            jointplot_fig, ax_joint = binned_jointplot(df, "amount", "replacement_cost", height=8, ratio=4)
+        else:
+            jointplot = sns.jointplot(
+                data=df,
+                x="amount",
+                y="replacement_cost",
+                kind="hex",
+                height=8,
+                ratio=4,
+                marginal_kws={'fill': True}
+            )
+            jointplot_fig, ax_joint = jointplot.fig, jointplot.ax_joint
+        ax_joint.set_xlabel('Сумма платежа ($)', fontsize=12, fontweight='bold')
+        ax_joint.set_ylabel('Стоимость замены ($)', fontsize=12, fontweight='bold')
+        jointplot_fig.suptitle('Совместное распределение', y=1.02, fontsize=16, fontweight='bold')
+        return jointplot_fig
+
+    show_figure("multivariate", "jointplot-binned" if binned else "jointplot", None, draw_jointplot)
 
     # График 4: Группированная столбчатая диаграмма
     st.subheader("4️⃣ Средний доход по жанрам с разбивкой по рейтингу")
@@ -214,25 +288,28 @@ elif page == "Многомерный анализ":
     - **Высота столбцов:** Средний доход для конкретного жанра и рейтинга
     """)
 
-    pivot_data = df.groupby(['category', 'rating'])['amount'].mean().reset_index()
-
-    fig4, ax4 = plt.subplots(figsize=(16, 8))
-    sns.barplot(
-        data=pivot_data,
-        x='category',
-        y='amount',
-        hue='rating',
-        palette='Set2',
-        ax=ax4
-    )
-    ax4.set_title('Средний доход по жанрам фильмов с разбивкой по возрастному рейтингу',
-                  fontsize=14, fontweight='bold', pad=20)
-    ax4.set_xlabel('Жанр фильма', fontsize=12, fontweight='bold')
-    ax4.set_ylabel('Средний доход ($)', fontsize=12, fontweight='bold')
-    ax4.tick_params(axis='x', rotation=45)
-    ax4.legend(title='Рейтинг MPAA', bbox_to_anchor=(1.05, 1), loc='upper left')
-    plt.tight_layout()
-    st.pyplot(fig4)
+    def draw_barplot():
+        pivot_data = df.groupby(['category', 'rating'])['amount'].mean().reset_index()
+
+        fig4, ax4 = plt.subplots(figsize=(16, 8))
+        sns.barplot(
+            data=pivot_data,
+            x='category',
+            y='amount',
+            hue='rating',
+            palette='Set2',
+            ax=ax4
+        )
+        ax4.set_title('Средний доход по жанрам фильмов с разбивкой по возрастному рейтингу',
+                      fontsize=14, fontweight='bold', pad=20)
+        ax4.set_xlabel('Жанр фильма', fontsize=12, fontweight='bold')
+        ax4.set_ylabel('Средний доход ($)', fontsize=12, fontweight='bold')
+        ax4.tick_params(axis='x', rotation=45)
+        ax4.legend(title='Рейтинг MPAA', bbox_to_anchor=(1.05, 1), loc='upper left')
+        plt.tight_layout()
+        return fig4
+
+    show_figure("multivariate", "barplot", None, draw_barplot)
 
     # График 5: Диаграмма рассеяния с множественными параметрами
     st.subheader("5️⃣ Зависимость длительности фильма и стоимости замены")
@@ -245,29 +322,36 @@ elif page == "Многомерный анализ":
     - **Прозрачность:** Помогает видеть перекрытия точек
     """)
 
-    top_categories = df['category'].value_counts().nlargest(5).index
-    filtered_df = df[df['category'].isin(top_categories)]
-
-    fig5, ax5 = plt.subplots(figsize=(14, 10))
-    scatter = sns.scatterplot(
-        data=filtered_df,
-        x='length',
-        y='replacement_cost',
-        hue='category',
-        size='amount',
-        sizes=(40, 200),
-        alpha=0.6,
-        palette='tab10',
-        ax=ax5
-    )
-    ax5.set_title('Зависимость длительности фильма и стоимости замены с разбивкой по жанру',
-                  fontsize=14, fontweight='bold', pad=20)
-    ax5.set_xlabel('Длительность фильма (минуты)', fontsize=12, fontweight='bold')
-    ax5.set_ylabel('Стоимость замены ($)', fontsize=12, fontweight='bold')
-    ax5.legend(title='Жанр', bbox_to_anchor=(1.05, 1), loc='upper left')
-    ax5.grid(True, alpha=0.3)
-    plt.tight_layout()
-    st.pyplot(fig5)
+    def draw_scatter():
+        top_categories = df['category'].value_counts().nlargest(5).index
+        filtered_df = df[df['category'].isin(top_categories)]
+
+        fig5, ax5 = plt.subplots(figsize=(14, 10))
+        if binned:
+            binned_scatter(ax5, filtered_df, x='length', y='replacement_cost', hue='category', size='amount',
+                           sizes=(40, 200), palette='tab10', alpha=0.6)
+        else:
+            sns.scatterplot(
+                data=filtered_df,
+                x='length',
+                y='replacement_cost',
+                hue='category',
+                size='amount',
+                sizes=(40, 200),
+                alpha=0.6,
+                palette='tab10',
+                ax=ax5
+            )
+        ax5.set_title('Зависимость длительности фильма и стоимости замены с разбивкой по жанру',
+                      fontsize=14, fontweight='bold', pad=20)
+        ax5.set_xlabel('Длительность фильма (минуты)', fontsize=12, fontweight='bold')
+        ax5.set_ylabel('Стоимость замены ($)', fontsize=12, fontweight='bold')
+        ax5.legend(title='Жанр', bbox_to_anchor=(1.05, 1), loc='upper left')
+        ax5.grid(True, alpha=0.3)
+        plt.tight_layout()
+        return fig5
+
+    show_figure("multivariate", "scatter-binned" if binned else "scatter", None, draw_scatter)
 
 # Footer
 st.sidebar.markdown("---")
@@ -2,11 +2,14 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from lab_1.app.utils.binned_kde import kdeplot_binned
+from lab_1.app.utils.binned_plots import binned_jointplot, binned_pairplot, binned_scatter, use_binned
+
 sns.set_theme(style="whitegrid")
 
-df = pd.read_csv('utils/data/optimized_sakila.csv')
+df = pd.read_parquet('utils/data/optimized_sakila_pg.parquet', columns=['rental_duration', 'rental_rate', 'length', 'replacement_cost', 'amount', 'category', 'rating'])
 
-numeric_columns = df.select_dtypes(include=["int64", "float64"]).columns
+numeric_columns = df.select_dtypes(include="number").columns
 
 meaningful_numeric = [
     col for col in numeric_columns
@@ -15,6 +18,9 @@ meaningful_numeric = [
 
 print("Used features:", meaningful_numeric)
 
+# на миллионах строк рисуем агрегаты (сетки плотности), а не каждую точку
+binned = use_binned(df)
+
 features_columns = ["amount", "replacement_cost"]
 #features_columns = meaningful_numeric
 
@@ -34,23 +40,28 @@ plt.show()
 # в моем случае слева свеху анализ распределения amount а справа снизу распределение для replacement cost
 # ну а последний - зависимости - тут так называемое прямоугольное облако, но в моем случае это рил прямоугольник
 # в случае если была бы зависиомсть то был бы наклон облака, а если свзять то точки лягли бы в прямую
-sns.pairplot(
-    df[features_columns],
-    diag_kind="kde",
-    corner=True
-)
+if binned:
+    binned_pairplot(df, features_columns)
+else:
+    # диагональ - KDE через FFT по гистограмме вместо diag_kind="kde"
+    pairgrid = sns.PairGrid(df[features_columns], corner=True)
+    pairgrid.map_lower(sns.scatterplot)
+    pairgrid.map_diag(kdeplot_binned)
 plt.suptitle("Pairwise feature distributions", y=1.02)
 plt.show()
 
 
 # показывает зависмости - если по центру все хаотично - то зависимости нет
 # если суопления точек - кластеры а наклон -зависимость
-sns.jointplot(
-    data=df,
-    x="amount",
-    y="replacement_cost",
-    kind="hex"
-)
+if binned:
+    binned_jointplot(df, "amount", "replacement_cost", height=6, ratio=5)
+else:
+    sns.jointplot(
+        data=df,
+        x="amount",
+        y="replacement_cost",
+        kind="hex"
+    )
 plt.show()
 
 pivot_data = df.groupby(['category', 'rating'])['amount'].mean().reset_index()
@@ -75,16 +86,19 @@ top_categories = df['category'].value_counts().nlargest(5).index
 filtered_df = df[df['category'].isin(top_categories)]
 
 plt.figure(figsize=(12, 8))
-sns.scatterplot(
-    data=filtered_df,
-    x='length',          # количественный
-    y='replacement_cost', # количественный
-    hue='category',      # категориальный (жанр)
-    size='amount',       # количественный (размер точки = доход)
-    sizes=(40, 200),
-    alpha=0.6,
-    palette='tab10'
-)
+if binned:
+    binned_scatter(plt.gca(), filtered_df, x='length', y='replacement_cost', hue='category', size='amount')
+else:
+    sns.scatterplot(
+        data=filtered_df,
+        x='length',          # количественный
+        y='replacement_cost', # количественный
+        hue='category',      # категориальный (жанр)
+        size='amount',       # количественный (размер точки = доход)
+        sizes=(40, 200),
+        alpha=0.6,
+        palette='tab10'
+    )
 plt.title('Зависимость длительности фильма и стоимости замены с разбивкой по жанру\n(размер точки = доход от проката)',
           fontsize=13, fontweight='bold')
 plt.xlabel('Длительность фильма (минуты)')
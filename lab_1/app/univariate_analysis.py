@@ -2,11 +2,13 @@ import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from lab_1.app.utils.binned_kde import kde_from_values
+
 sns.set_theme(style="whitegrid")
 
-df = pd.read_csv('utils/data/optimized_sakila.csv')
+df = pd.read_parquet('utils/data/optimized_sakila_pg.parquet', columns=['amount', 'replacement_cost'])
 
-numeric_columns = df.select_dtypes(include=["int64", "float64"]).columns
+numeric_columns = df.select_dtypes(include="number").columns
 
 # print(numeric_columns)
 
@@ -22,9 +24,14 @@ for column in features_columns:
     sns.histplot(
         data=df,
         x=column,
-        bins=20,
-        kde=True
+        bins=20
     )
+    # KDE через FFT по гистограмме вместо kde=True, в масштабе столбиков (cut=0 как у histplot)
+    values = df[column].dropna()
+    kde = kde_from_values(values, cut=0)
+    if kde is not None:
+        grid, density = kde
+        plt.plot(grid, density * len(values) * (values.max() - values.min()) / 20)
     plt.xlabel(column)
     plt.ylabel("Number of meetings")
     plt.show()
@@ -0,0 +1,93 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+# KDE по гистограмме: строки раскладываются по KDE_GRID мелким бинам (или берутся готовые
+# счетчики из sidecar), а гауссово ядро сворачивается с ними через FFT.
+# цена O(бинов * log(бинов)) вместо O(строк * точек сетки) у gaussian_kde / seaborn.
+# точность: при 1024 бинах максимальное отклонение от seaborn/scipy (bw_method="scott")
+# меньше 0.1% от пика плотности, пока ширина ядра больше пары бинов (проверка - __main__ ниже)
+KDE_GRID = 1024
+TRUNCATE = 4.0
+
+
+def scott_bandwidth(n: float, std: float, bw_adjust: float = 1.0) -> float:
+    # как scipy.stats.gaussian_kde(bw_method='scott'), которым пользуется seaborn
+    return n ** (-1 / 5) * std * bw_adjust
+
+
+def binned_kde(counts, edges, std: float = None, bw_adjust: float = 1.0, cut: float = 0.0):
+    # counts/edges - равномерная гистограмма; возвращает (сетка, плотность) или None,
+    # если данных мало или они постоянные
+    counts = np.asarray(counts, dtype=np.float64)
+    edges = np.asarray(edges, dtype=np.float64)
+    n = counts.sum()
+    delta = edges[1] - edges[0]
+    centers = edges[:-1] + delta / 2
+
+    if std is None:
+        mean = (counts * centers).sum() / n
+        std = np.sqrt((counts * (centers - mean) ** 2).sum() / max(n - 1, 1))
+    if n < 2 or not std > 0:
+        return None
+
+    bw = scott_bandwidth(n, std, bw_adjust)
+
+    # cut > 0 продлевает сетку за пределы данных на cut ширин ядра (как kdeplot)
+    pad = int(np.ceil(cut * bw / delta))
+    counts = np.pad(counts, pad)
+    grid = edges[0] + delta / 2 + (np.arange(len(counts)) - pad) * delta
+
+    m = len(counts)
+    k = min(int(np.ceil(TRUNCATE * bw / delta)), m - 1)
+    offsets = np.arange(-k, k + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+
+    # линейная свертка через FFT, из полной свертки берем кусок, совпадающий с сеткой
+    size = m + 2 * k
+    n_fft = 1 << int(np.ceil(np.log2(size)))
+    conv = np.fft.irfft(np.fft.rfft(counts, n_fft) * np.fft.rfft(kernel, n_fft), n_fft)[k:k + m]
+    density = np.clip(conv, 0, None) / n
+    return grid, density
+
+
+def kde_from_values(values, gridsize: int = KDE_GRID, bw_adjust: float = 1.0, cut: float = 3.0):
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if len(values) < 2:
+        return None
+    low, high = values.min(), values.max()
+    if low == high:
+        return None
+    counts, edges = np.histogram(values, bins=gridsize, range=(low, high))
+    return binned_kde(counts, edges, std=values.std(ddof=1), bw_adjust=bw_adjust, cut=cut)
+
+
+def kdeplot_binned(x, ax=None, fill: bool = False, color=None, cut: float = 3.0, label=None, **kwargs):
+    # замена sns.kdeplot для диагонали PairGrid (map_diag) и одиночных графиков
+    ax = ax or plt.gca()
+    result = kde_from_values(x, cut=cut)
+    if result is None:
+        return ax
+    grid, density = result
+    line, = ax.plot(grid, density, color=color, label=label)
+    if fill:
+        ax.fill_between(grid, density, color=line.get_color(), alpha=0.25)
+    return ax
+
+
+if __name__ == "__main__":
+    # сравнение с точным KDE (scipy.stats.gaussian_kde - его же использует seaborn)
+    from scipy.stats import gaussian_kde
+
+    rng = np.random.default_rng(42)
+    samples = {
+        'normal': rng.normal(0, 1, 200_000),
+        'bimodal': np.concatenate([rng.normal(-2, 0.5, 100_000), rng.normal(3, 1, 50_000)]),
+        'amount-like': rng.choice([0.99, 2.99, 4.99, 5.99, 7.99, 9.99], 100_000) + rng.normal(0, 0.01, 100_000),
+        'skewed': rng.exponential(2, 200_000),
+    }
+    for name, values in samples.items():
+        grid, density = kde_from_values(values, cut=0)
+        exact = gaussian_kde(values)(grid[::8])
+        error = np.abs(density[::8] - exact).max() / exact.max()
+        print(f"{name}: max error {error:.4%} of peak")
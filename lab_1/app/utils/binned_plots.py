@@ -0,0 +1,143 @@
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+import numpy as np
+import pandas as pd
+
+from lab_1.app.utils.binned_kde import kdeplot_binned
+
+# выше этого числа строк рисуем не точки, а заранее посчитанные агрегаты (сетки плотности, гистограммы)
+BINNED_THRESHOLD = 200_000
+GRID_BINS = 60
+MARGINAL_BINS = 50
+
+
+def use_binned(df: pd.DataFrame, threshold: int = BINNED_THRESHOLD) -> bool:
+    return len(df) > threshold
+
+
+def _finite(*arrays) -> list:
+    arrays = [np.asarray(a, dtype=np.float64) for a in arrays]
+    mask = np.logical_and.reduce([np.isfinite(a) for a in arrays])
+    return [a[mask] for a in arrays]
+
+
+def _edges(values: np.ndarray, bins: int) -> np.ndarray:
+    low, high = (values.min(), values.max()) if len(values) else (0.0, 1.0)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def _bin_index(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    # номер бина для каждого значения, правый край включаем в последний бин (как np.histogram)
+    return np.clip(np.searchsorted(edges, values, side='right') - 1, 0, len(edges) - 2)
+
+
+def density_grid(x, y, bins: int = GRID_BINS):
+    x, y = _finite(x, y)
+    x_edges, y_edges = _edges(x, bins), _edges(y, bins)
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    return counts, x_edges, y_edges
+
+
+def draw_density(ax, x, y, bins: int = GRID_BINS, cmap: str = 'Blues'):
+    counts, x_edges, y_edges = density_grid(x, y, bins)
+    # пустые клетки прозрачные, остальные - в лог-шкале, чтобы было видно и редкие области
+    shown = np.ma.masked_equal(counts.T, 0)
+    mesh = ax.pcolormesh(x_edges, y_edges, shown, cmap=cmap, norm=LogNorm())
+    return mesh
+
+
+def draw_marginal(ax, values, bins: int = MARGINAL_BINS, vertical: bool = False, color: str = 'C0'):
+    (values,) = _finite(values)
+    counts, edges = np.histogram(values, bins=_edges(values, bins))
+    ax.stairs(counts, edges, fill=True, alpha=0.6, color=color,
+              orientation='horizontal' if vertical else 'vertical')
+
+
+def binned_pairplot(df: pd.DataFrame, columns: list, bins: int = GRID_BINS, height: float = 2.5):
+    # аналог sns.pairplot(corner=True, diag_kind="kde"): на диагонали KDE по гистограмме, ниже - сетки плотности
+    n = len(columns)
+    fig, axes = plt.subplots(n, n, figsize=(height * n, height * n), squeeze=False)
+
+    for i, row in enumerate(columns):
+        for j, col in enumerate(columns):
+            ax = axes[i, j]
+            if j > i:
+                ax.remove()
+                continue
+            if i == j:
+                kdeplot_binned(df[col], ax=ax, fill=True)
+            else:
+                draw_density(ax, df[col], df[row], bins)
+            if i == n - 1:
+                ax.set_xlabel(col)
+            if j == 0:
+                ax.set_ylabel(row)
+
+    fig.tight_layout()
+    return fig
+
+
+def binned_jointplot(df: pd.DataFrame, x: str, y: str, bins: int = GRID_BINS, height: float = 8, ratio: int = 4):
+    # аналог sns.jointplot(kind="hex"): сетка плотности + гистограммы по краям
+    fig = plt.figure(figsize=(height, height))
+    grid = fig.add_gridspec(ratio + 1, ratio + 1)
+    ax_joint = fig.add_subplot(grid[1:, :-1])
+    ax_marg_x = fig.add_subplot(grid[0, :-1], sharex=ax_joint)
+    ax_marg_y = fig.add_subplot(grid[1:, -1], sharey=ax_joint)
+
+    draw_density(ax_joint, df[x], df[y], bins)
+    draw_marginal(ax_marg_x, df[x], bins)
+    draw_marginal(ax_marg_y, df[y], bins, vertical=True)
+
+    for ax in (ax_marg_x, ax_marg_y):
+        ax.tick_params(labelbottom=False, labelleft=False)
+        ax.grid(False)
+    ax_joint.set_xlabel(x)
+    ax_joint.set_ylabel(y)
+
+    fig.tight_layout()
+    return fig, ax_joint
+
+
+def binned_scatter(ax, df: pd.DataFrame, x: str, y: str, hue: str, size: str,
+                   bins: int = GRID_BINS, sizes: tuple = (40, 200), palette: str = 'tab10', alpha: float = 0.6):
+    # аналог sns.scatterplot(hue=..., size=...): одна точка на клетку сетки и группу hue,
+    # в центре масс клетки, размер - среднее size в клетке
+    hue_values = pd.Categorical(df[hue])
+    if hue_values.categories.empty:
+        return ax
+    codes = hue_values.codes
+    x_values, y_values, size_values, codes = _finite(df[x], df[y], df[size], codes)
+    codes = codes.astype(np.int64)
+    keep = codes >= 0
+    x_values, y_values, size_values, codes = x_values[keep], y_values[keep], size_values[keep], codes[keep]
+
+    x_edges, y_edges = _edges(x_values, bins), _edges(y_values, bins)
+    cell = (codes * bins + _bin_index(x_values, x_edges)) * bins + _bin_index(y_values, y_edges)
+    n_cells = len(hue_values.categories) * bins * bins
+
+    # все агрегаты за один bincount на каждую величину
+    counts = np.bincount(cell, minlength=n_cells)
+    sum_x = np.bincount(cell, weights=x_values, minlength=n_cells)
+    sum_y = np.bincount(cell, weights=y_values, minlength=n_cells)
+    sum_size = np.bincount(cell, weights=size_values, minlength=n_cells)
+
+    filled = np.flatnonzero(counts)
+    if len(filled) == 0:
+        return ax
+    mean_size = sum_size[filled] / counts[filled]
+    low, high = mean_size.min(), mean_size.max()
+    scale = (mean_size - low) / (high - low) if high > low else np.full_like(mean_size, 0.5)
+    point_sizes = sizes[0] + scale * (sizes[1] - sizes[0])
+
+    # цвета раздаем только присутствующим группам, как seaborn
+    colors = plt.get_cmap(palette).colors
+    group = filled // (bins * bins)
+    for i, code in enumerate(np.unique(group)):
+        mask = group == code
+        cells = filled[mask]
+        ax.scatter(sum_x[cells] / counts[cells], sum_y[cells] / counts[cells], s=point_sizes[mask],
+                   color=colors[i % len(colors)], alpha=alpha, label=hue_values.categories[code])
+    return ax
@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lab_1.app.utils.binned_kde import KDE_GRID
+from lab_1.app.utils.fingerprint import file_fingerprint
+
+STATS_VERSION = 2
+QUANTILES = [0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+HIST_BINS = 30
+OUTLIERS_HEAD = 20
+MAX_FLIERS = 500
+
+
+def column_stats(values: pd.Series, bins: int = HIST_BINS) -> dict:
+    # все, что рисует страница одномерного анализа, за один проход по отсортированному столбцу
+    x = np.sort(values.dropna().to_numpy(dtype=np.float64))
+    n = len(x)
+    if n == 0:
+        return {'count': 0, 'missing': int(values.isna().sum()), 'nunique': 0}
+
+    q1, median, q3 = np.quantile(x, [0.25, 0.5, 0.75])
+    iqr = q3 - q1
+    lower_bound = q1 - 1.5 * iqr
+    upper_bound = q3 + 1.5 * iqr
+
+    outlier_mask = (values < lower_bound) | (values > upper_bound)
+    outliers = values[outlier_mask]
+    inliers = x[(x >= lower_bound) & (x <= upper_bound)]
+    fliers = np.unique(outliers.to_numpy(dtype=np.float64))
+
+    counts, edges = np.histogram(x, bins=bins)
+    # мелкая гистограмма для KDE (binned_kde), чтобы кривая строилась без исходных строк
+    kde_counts, kde_edges = np.histogram(x, bins=KDE_GRID)
+
+    return {
+        'describe': {
+            'count': float(n),
+            'mean': float(x.mean()),
+            'std': float(x.std(ddof=1)) if n > 1 else float('nan'),
+            'min': float(x[0]),
+            '25%': float(q1),
+            '50%': float(median),
+            '75%': float(q3),
+            'max': float(x[-1]),
+        },
+        'count': n,
+        'missing': int(len(values) - n),
+        'nunique': int(np.count_nonzero(np.diff(x)) + 1),
+        'quantiles': np.quantile(x, QUANTILES).tolist(),
+        'lower_bound': float(lower_bound),
+        'upper_bound': float(upper_bound),
+        'n_outliers': int(outlier_mask.sum()),
+        'outliers_head': [[str(i), float(v)] for i, v in outliers.head(OUTLIERS_HEAD).items()],
+        # для boxplot: усы по самым дальним точкам внутри границ, выбросы - уникальные значения
+        'whislo': float(inliers[0]) if len(inliers) else float(q1),
+        'whishi': float(inliers[-1]) if len(inliers) else float(q3),
+        'fliers': fliers[:MAX_FLIERS].tolist(),
+        'hist_counts': counts.tolist(),
+        'hist_edges': edges.tolist(),
+        'kde_counts': kde_counts.tolist(),
+        'kde_edges': kde_edges.tolist(),
+    }
+
+
+def build_stats(df: pd.DataFrame, columns, fingerprint: str) -> dict:
+    return {
+        'version': STATS_VERSION,
+        'fingerprint': fingerprint,
+        'n_rows': len(df),
+        'columns': {column: column_stats(df[column]) for column in columns},
+    }
+
+
+def load_column_stats(path: str, df: pd.DataFrame, columns) -> dict:
+    # sidecar рядом с датасетом: <датасет>.stats.json.
+    # пересчитывается, только если файл датасета поменялся (другой fingerprint)
+    sidecar = Path(f"{path}.stats.json")
+    fingerprint = file_fingerprint(path)
+
+    if sidecar.exists():
+        stats = json.loads(sidecar.read_text())
+        if (stats.get('version') == STATS_VERSION and stats.get('fingerprint') == fingerprint
+                and set(columns) <= set(stats['columns'])):
+            return stats
+
+    stats = build_stats(df, columns, fingerprint)
+    sidecar.write_text(json.dumps(stats))
+    return stats
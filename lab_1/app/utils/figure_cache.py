@@ -0,0 +1,92 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+
+# png целиком: сигнатура в начале и чанк IEND в конце - обрезанный файл не проходит проверку
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_END = b'IEND\xaeB`\x82'
+
+
+class FigureCache:
+    # готовые png по ключу (страница, график, столбец, fingerprint датасета).
+    # в памяти - LRU на max_items картинок, на диске (если задан cache_dir) - до max_disk_items файлов,
+    # самые давно использованные удаляются первыми. один объект на процесс - общий для всех сессий
+    def __init__(self, max_items: int = 64, cache_dir: str = None, max_disk_items: int = 512):
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _name(key) -> str:
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        name = self._name(key)
+        with self._lock:
+            if name in self._items:
+                self._items.move_to_end(name)
+                self.hits += 1
+                return self._items[name]
+
+        if self.cache_dir:
+            path = self.cache_dir / f"{name}.png"
+            try:
+                png = path.read_bytes()
+                path.touch()
+            except OSError:
+                # нет файла или его только что удалило вытеснение в другой сессии - промах
+                png = None
+            if png is not None and png.startswith(PNG_SIGNATURE) and png.endswith(PNG_END):
+                self._remember(name, png)
+                with self._lock:
+                    self.hits += 1
+                return png
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, png: bytes):
+        name = self._name(key)
+        self._remember(name, png)
+        if self.cache_dir:
+            # временный файл + атомарная подмена: другая сессия или прерванный запуск не увидят полфайла
+            partial = self.cache_dir / f"{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+            partial.write_bytes(png)
+            os.replace(partial, self.cache_dir / f"{name}.png")
+            self._evict_disk()
+
+    def render(self, key, draw) -> bytes:
+        # draw() строит и возвращает matplotlib-фигуру, вызывается только при промахе
+        png = self.get(key)
+        if png is None:
+            fig = draw()
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', bbox_inches='tight', dpi=200)
+            plt.close(fig)
+            png = buffer.getvalue()
+            self.put(key, png)
+        return png
+
+    def _remember(self, name: str, png: bytes):
+        with self._lock:
+            self._items[name] = png
+            self._items.move_to_end(name)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _evict_disk(self):
+        files = sorted(self.cache_dir.glob('*.png'), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(len(files) - self.max_disk_items, 0)]:
+            path.unlink(missing_ok=True)
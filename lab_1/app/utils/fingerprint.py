@@ -0,0 +1,20 @@
+import hashlib
+from pathlib import Path
+
+
+def file_fingerprint(path: str) -> str:
+    # версия датасета: меняется при любой перезаписи файла (размер или время изменения)
+    stat = Path(path).stat()
+    return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def content_fingerprint(path: str) -> str:
+    # версия по содержимому, а не по времени записи: копии одного parquet в разных lab_*/data совпадают.
+    # футер parquet (число строк, row group'ы, размеры и статистики столбцов) читается без данных
+    if not str(path).endswith('.parquet'):
+        return file_fingerprint(path)
+    import pyarrow.parquet as pq
+
+    metadata = pq.read_metadata(path).to_dict()
+    metadata.pop('created_by', None)
+    return hashlib.sha1(f"{Path(path).stat().st_size}:{metadata}".encode()).hexdigest()[:16]
@@ -1,16 +1,13 @@
 import pandas as pd
 
-
-df = pd.read_csv('data/sakila_to_csv_pg.csv')
-
-df_copy = df.copy()
+from lab_1.app.utils.schema_dtypes import pandas_dtypes
 
 # год всегда 2006, язык всегда один (поэтому id=1, lang = english
 # district и address2 всегда пустые
 # film_category_id и film_actor_id дублируют film_id
 # manager_staff_id дублирует staff_id
 # category_id дублирует category
-df_copy.drop(columns=[
+dropped = [
     'release_year',
     'language_id',
     'district',
@@ -20,20 +17,21 @@ df_copy.drop(columns=[
     'film_actor_id',
     'manager_staff_id',
     'category_id'
-], inplace=True)
+]
 
-df_copy['return_date'] = df_copy['return_date'].fillna(df_copy['return_date'].mode()[0])
+columns = [c for c in pd.read_csv('data/sakila_to_csv_pg.csv', nrows=0).columns if c not in dropped]
 
-df_optimized = df_copy.copy()
+# типы берем из моделей (SmallInteger -> int16, ключи -> int32, Enum -> упорядоченная category, DateTime -> дата),
+# поэтому read_csv сразу отдает компактные столбцы без промежуточных int64/object
+dtypes, parse_dates = pandas_dtypes(columns)
+df_optimized = pd.read_csv('data/sakila_to_csv_pg.csv', usecols=columns, dtype=dtypes, parse_dates=parse_dates)
 
-df_optimized['length'] = df_optimized['length'].astype('int16')
-df_optimized['rental_duration'] = df_optimized['rental_duration'].astype('int8')
-df_optimized['store_id'] = df_optimized['store_id'].astype('int8')
-df_optimized['rating'] = df_optimized['rating'].astype('category')
-df_optimized['category'] = df_optimized['category'].astype('category')
-df_optimized['rental_date'] = pd.to_datetime(df_optimized['rental_date'])
+df_optimized['return_date'] = df_optimized['return_date'].fillna(df_optimized['return_date'].mode()[0])
 
 print(df_optimized.dtypes)
 
 df_optimized.to_csv('data/optimized_sakila_pg.csv', index=False)
 
+# csv теряет все типы выше, а parquet хранит int16/int32, category и datetime как есть
+# и умеет читать только нужные столбцы (pd.read_parquet(..., columns=[...]))
+df_optimized.to_parquet('data/optimized_sakila_pg.parquet', index=False)
@@ -0,0 +1,174 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+STAR_DIR = 'data/star'
+
+# звезда вместо одной широкой таблицы: факт - платеж (одна строка на платеж),
+# а фильмы, актеры, клиенты, адреса и магазины лежат отдельно и ключуются id из models.py.
+# в широкой выгрузке каждый платеж повторяется по числу актеров фильма (~5 раз)
+STAR_TABLES = {
+    'fact_payment': {
+        'columns': """
+            p.payment_id, p.rental_id, p.customer_id, p.staff_id payment_staff_id,
+            p.amount, p.payment_date,
+            r.rental_date, r.return_date, r.inventory_id,
+            i.film_id, i.store_id inventory_store_id
+        """,
+        'source': """
+            payment p
+            JOIN rental r ON p.rental_id = r.rental_id
+            JOIN inventory i ON r.inventory_id = i.inventory_id
+        """,
+        'key': ['payment_id'],
+        # payment.last_update допускает NULL - тогда момент изменения строки - дата платежа
+        'updated': ['COALESCE(p.last_update, p.payment_date)', 'r.last_update', 'i.last_update'],
+    },
+    'film': {
+        # в sakila у фильма одна категория, поэтому film_category не размножает строки
+        'columns': """
+            f.film_id, f.title, f.description, f.release_year, f.language_id, f.rental_duration,
+            f.rental_rate, f.length, f.replacement_cost, f.rating,
+            cat.category_id, cat.name category, l.name language
+        """,
+        'source': """
+            film f
+            JOIN film_category fc ON f.film_id = fc.film_id
+            JOIN category cat ON fc.category_id = cat.category_id
+            JOIN language l ON f.language_id = l.language_id
+        """,
+        # ключ - только film_id: при смене категории строка фильма заменяется, а не дублируется
+        'key': ['film_id'],
+        'updated': ['f.last_update', 'fc.last_update', 'cat.last_update', 'l.last_update'],
+    },
+    'film_actor': {
+        'columns': "fa.film_id, act.actor_id, act.first_name actor_fn, act.last_name actor_ln",
+        'source': """
+            film_actor fa
+            JOIN actor act ON fa.actor_id = act.actor_id
+        """,
+        'key': ['film_id', 'actor_id'],
+        'updated': ['fa.last_update', 'act.last_update'],
+    },
+    'customer': {
+        'columns': """
+            c.customer_id, c.first_name cust_fn, c.last_name cust_ln, c.email, c.active,
+            c.store_id, c.address_id
+        """,
+        'source': "customer c",
+        'key': ['customer_id'],
+        # customer.last_update допускает NULL, а NULL > :watermark никогда не выполняется -
+        # без COALESCE такой клиент выгрузился бы один раз и больше не попадал в инкременты
+        'updated': ['COALESCE(c.last_update, c.create_date)'],
+    },
+    'address': {
+        'columns': """
+            addr.address_id, addr.address, addr.address2, addr.district, addr.postal_code,
+            ct.city_id, ct.city, co.country_id, co.country
+        """,
+        'source': """
+            address addr
+            JOIN city ct ON addr.city_id = ct.city_id
+            JOIN country co ON ct.country_id = co.country_id
+        """,
+        'key': ['address_id'],
+        'updated': ['addr.last_update', 'ct.last_update', 'co.last_update'],
+    },
+    'store': {
+        'columns': """
+            s.store_id, s.manager_staff_id,
+            stf.staff_id, stf.first_name staff_fn, stf.last_name staff_ln
+        """,
+        'source': """
+            store s
+            JOIN staff stf ON s.manager_staff_id = stf.staff_id
+        """,
+        'key': ['store_id'],
+        'updated': ['s.last_update', 'stf.last_update'],
+    },
+}
+
+
+def star_query(name: str, incremental: bool = False) -> str:
+    # last_update строки = самое свежее last_update среди таблиц, из которых она собрана
+    table = STAR_TABLES[name]
+    updated = table['updated']
+    changed = updated[0] if len(updated) == 1 else f"GREATEST({', '.join(updated)})"
+    sql = f"SELECT {table['columns']}, {changed} last_update FROM {table['source']}"
+    if incremental:
+        sql += f" WHERE {changed} > :watermark"
+    return sql
+
+
+# измерение -> (ключ соединения, измерения, через которые оно цепляется к факту)
+DIMENSIONS = {
+    'film': ('film_id', []),
+    'film_actor': ('film_id', []),
+    'customer': ('customer_id', []),
+    'address': ('address_id', ['customer']),
+    'store': ('store_id', ['customer']),
+}
+
+
+def _resolve(dimensions) -> list[str]:
+    ordered = []
+    for name in dimensions:
+        if name not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension: {name}")
+        for parent in DIMENSIONS[name][1]:
+            if parent not in ordered:
+                ordered.append(parent)
+        if name not in ordered:
+            ordered.append(name)
+    return ordered
+
+
+def _read_table(star_dir: str, name: str, columns=None) -> pd.DataFrame:
+    path = Path(star_dir) / f'{name}.parquet'
+    if columns is not None:
+        available = pq.read_schema(path).names
+        columns = [c for c in available if c in columns]
+    return pd.read_parquet(path, columns=columns)
+
+
+def load_star(star_dir: str = STAR_DIR, dimensions=(), columns=None) -> pd.DataFrame:
+    # присоединяем к факту только запрошенные измерения;
+    # columns ограничивает набор столбцов (ключи подтягиваются сами)
+    dimensions = _resolve(dimensions)
+    keys = {DIMENSIONS[name][0] for name in dimensions}
+    wanted = None if columns is None else set(columns) | keys
+
+    df = _read_table(star_dir, 'fact_payment', wanted)
+
+    for name in dimensions:
+        key = DIMENSIONS[name][0]
+        dim = _read_table(star_dir, name, wanted)
+        dim_columns = [c for c in dim.columns if c not in df.columns]
+
+        if dim[key].is_unique:
+            # один к одному - берем строки измерения по ключу через индекс, без merge
+            taken = dim.set_index(key)[dim_columns].reindex(df[key].to_numpy())
+            df = pd.concat([df, taken.set_axis(df.index)], axis=1)
+        else:
+            df = df.merge(dim[[key] + dim_columns], on=key, how='left')
+
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+if __name__ == "__main__":
+    # python sakila_star.py [папка со звездой] [широкая выгрузка для сравнения]
+    star_dir = sys.argv[1] if len(sys.argv) > 1 else STAR_DIR
+    fact = load_star(star_dir)
+    print(f"fact_payment: {len(fact)} rows")
+
+    for dims in [['film', 'customer', 'address'], ['film', 'film_actor']]:
+        df = load_star(star_dir, dims)
+        print(f"{' + '.join(dims)}: {len(df)} rows, {df.shape[1]} columns")
+
+    if len(sys.argv) > 2:
+        wide = pd.read_csv(sys.argv[2], usecols=['payment_id'])
+        print(f"denormalized export: {len(wide)} rows ({len(wide) / len(fact):.1f}x fact)")
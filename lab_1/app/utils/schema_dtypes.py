@@ -0,0 +1,123 @@
+import pandas as pd
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, SmallInteger, String, Text
+
+from lab_1.app.models.models import (
+    Actor, Base, Category, Customer, FilmActor, FilmCategory, Inventory, Language, Payment, Staff
+)
+
+# столбцы выгрузок, которые в запросах переименованы (alias -> столбец модели)
+ALIASES = {
+    'actor_fn': Actor.__table__.c.first_name,
+    'actor_ln': Actor.__table__.c.last_name,
+    'cust_fn': Customer.__table__.c.first_name,
+    'cust_ln': Customer.__table__.c.last_name,
+    'staff_fn': Staff.__table__.c.first_name,
+    'staff_ln': Staff.__table__.c.last_name,
+    'category': Category.__table__.c.name,
+    'language': Language.__table__.c.name,
+    'film_category_id': FilmCategory.__table__.c.film_id,
+    'film_actor_id': FilmActor.__table__.c.actor_id,
+    'payment_staff_id': Payment.__table__.c.staff_id,
+    'inventory_store_id': Inventory.__table__.c.store_id,
+}
+
+
+def _model_columns() -> dict:
+    # имя столбца -> столбец модели; если имя есть в нескольких таблицах,
+    # берем ту, где он первичный ключ (film_id -> film.film_id, а не film_actor.film_id)
+    columns = {}
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            owner = column.primary_key and not column.foreign_keys
+            if column.name not in columns or owner:
+                columns[column.name] = column
+    columns.update(ALIASES)
+    return columns
+
+
+MODEL_COLUMNS = _model_columns()
+
+
+def _is_key(column) -> bool:
+    # первичные и внешние ключи растут вместе с историей (payment_id, rental_id...), поэтому в int16
+    # не сужаются даже при SmallInteger в модели: read_csv(dtype=int16) и astype молча заворачивают 40000 в -25536
+    return column.primary_key or bool(column.foreign_keys)
+
+
+def column_dtype(column):
+    # тип столбца модели -> компактный тип pandas; None для дат и неподдерживаемых типов.
+    # Float в sakila - деньги (amount, rental_rate, replacement_cost): float64, в float32 суммы уплывают на центы
+    sql_type = column.type
+    nullable = column.nullable and not column.primary_key
+
+    if isinstance(sql_type, Enum):
+        return pd.CategoricalDtype(sql_type.enums, ordered=True)
+    if isinstance(sql_type, Boolean):
+        return 'boolean' if nullable else 'bool'
+    if isinstance(sql_type, SmallInteger) and not _is_key(column):
+        return 'Int16' if nullable else 'int16'
+    if isinstance(sql_type, Integer):
+        return 'Int32' if nullable else 'int32'
+    if isinstance(sql_type, Float):
+        return 'float64'
+    if isinstance(sql_type, (String, Text)):
+        # строки в выгрузке повторяются (по фильму, клиенту, стране) - словарь дешевле
+        return 'category'
+    return None
+
+
+def pandas_dtypes(columns) -> tuple[dict, list]:
+    # dtype и parse_dates для read_csv / read_sql по метаданным моделей,
+    # столбцы, которых нет в моделях (производные признаки), пропускаются
+    dtypes = {}
+    parse_dates = []
+    for name in columns:
+        column = MODEL_COLUMNS.get(name)
+        if column is None:
+            continue
+        if isinstance(column.type, DateTime):
+            parse_dates.append(name)
+            continue
+        dtype = column_dtype(column)
+        if dtype is not None:
+            dtypes[name] = dtype
+    return dtypes, parse_dates
+
+
+def apply_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    # для уже прочитанных кадров (read_sql по чанкам, склейка инкрементов)
+    dtypes, parse_dates = pandas_dtypes(df.columns)
+    df = df.astype(dtypes)
+    for name in parse_dates:
+        df[name] = pd.to_datetime(df[name])
+    return df
+
+
+def arrow_schema(columns):
+    # та же схема для pyarrow (например, pq.read_table(..., schema=...))
+    import pyarrow as pa
+
+    fields = []
+    for name in columns:
+        column = MODEL_COLUMNS.get(name)
+        if column is None:
+            continue
+        sql_type = column.type
+        if isinstance(sql_type, DateTime):
+            arrow_type = pa.timestamp('us')
+        elif isinstance(sql_type, Enum):
+            arrow_type = pa.dictionary(pa.int8(), pa.string(), ordered=True)
+        elif isinstance(sql_type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(sql_type, SmallInteger) and not _is_key(column):
+            arrow_type = pa.int16()
+        elif isinstance(sql_type, Integer):
+            arrow_type = pa.int32()
+        elif isinstance(sql_type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(sql_type, (String, Text)):
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            continue
+        fields.append(pa.field(name, arrow_type, nullable=column.nullable and not column.primary_key))
+    return pa.schema(fields)
@@ -0,0 +1,43 @@
+import sys
+import time
+
+import pandas as pd
+
+# сравнение загрузки csv и parquet после sakila_csv_optimizer.py
+# python storage_benchmark.py [путь без расширения]
+base = sys.argv[1] if len(sys.argv) > 1 else 'data/optimized_sakila_pg'
+projection = ['amount', 'replacement_cost', 'length', 'rental_duration', 'rating', 'category', 'country']
+repeats = 5
+
+
+def measure(load) -> tuple[float, float, pd.DataFrame]:
+    best = float('inf')
+    df = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        df = load()
+        best = min(best, time.perf_counter() - start)
+    return best, df.memory_usage(deep=True).sum() / 1024 ** 2, df
+
+
+loaders = {
+    'csv': lambda: pd.read_csv(f'{base}.csv'),
+    'csv (usecols)': lambda: pd.read_csv(f'{base}.csv', usecols=projection),
+    'parquet': lambda: pd.read_parquet(f'{base}.parquet'),
+    'parquet (columns)': lambda: pd.read_parquet(f'{base}.parquet', columns=projection),
+}
+
+rows = []
+for name, load in loaders.items():
+    seconds, memory_mb, df = measure(load)
+    rows.append({
+        'format': name,
+        'load_s': seconds,
+        'memory_mb': memory_mb,
+        'columns': df.shape[1],
+        'int64/text columns': sum(str(dtype) in ('int64', 'object', 'str', 'string') for dtype in df.dtypes),
+    })
+
+result = pd.DataFrame(rows)
+result['speedup_vs_csv'] = result['load_s'].iloc[0] / result['load_s']
+print(result.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
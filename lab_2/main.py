@@ -1,39 +1,51 @@
 import pandas as pd
 
+from lab_1.app.utils.fingerprint import content_fingerprint
 from lab_2.utils.encoding import encode
+from lab_2.utils.group_index import GroupIndex
 from lab_2.utils.hypothesis import hypothesis_one, hypothesis_two, hypothesis_three
 from lab_2.utils.metrics import calculate_metrics
 from lab_2.utils.new_features import create_features
 from lab_2.utils.plots import plot_hypothesis_one, plot_hypothesis_two, plot_hypothesis_three
 
-df = pd.read_csv("data/optimized_sakila_pg.csv")
-print("data: ", df.shape)
-print()
-
-df  = create_features(df)
-print("features created")
-print()
-
-df = encode(df)
-print("features encoded")
-print()
-
-metrics = calculate_metrics(df)
-print("metrics calculated")
-print()
-
-print("проверка гипотез")
-
-h1 = hypothesis_one(df)
-print(h1)
-plot_hypothesis_one(df)
-
-print()
-
-h2 = hypothesis_two(df)
-plot_hypothesis_two(df)
-print(h2)
-
-h3 = hypothesis_three(df)
-plot_hypothesis_three(df)
-print(h3)
\ No newline at end of file
+# воркеры resampling на windows/macos заново импортируют этот модуль - без guard'а скрипт запустится в каждом
+if __name__ == "__main__":
+    columns = [
+        'rental_id', 'rental_date', 'return_date', 'customer_id', 'film_id',
+        'amount', 'rating', 'category', 'country', 'length'
+    ]
+    data_path = "data/optimized_sakila_pg.parquet"
+    df = pd.read_parquet(data_path, columns=columns)
+    print("data: ", df.shape)
+    print()
+
+    # признаки берутся из общего с lab_3 кэша, если этот датасет уже считали
+    df = create_features(df, fingerprint=content_fingerprint(data_path))
+    print("features created")
+    print()
+
+    df = encode(df)
+    print("features encoded")
+    print()
+
+    metrics = calculate_metrics(df)
+    print("metrics calculated")
+    print()
+
+    print("проверка гипотез")
+    # amount сортируется один раз на обе гипотезы про выручку
+    amount_index = GroupIndex(df['amount'])
+
+    h1 = hypothesis_one(df, index=amount_index)
+    print(h1)
+    plot_hypothesis_one(df)
+
+    print()
+
+    h2 = hypothesis_two(df, index=amount_index)
+    plot_hypothesis_two(df)
+    print(h2)
+
+    h3 = hypothesis_three(df)
+    plot_hypothesis_three(df)
+    print(h3)
@@ -1,30 +1,188 @@
 import numpy as np
-from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
 import pandas as pd
+from scipy import sparse
+
+# общий кодировщик lab_2 и lab_3. все выходы пишутся новыми столбцами прямо во входной кадр:
+# без df.copy(), apply по строкам, reset_index и concat. категории перекодируются через коды pandas.Categorical
+RATING_ORDER = ['G', 'PG', 'PG-13', 'R', 'NC-17']
+TOP_COUNTRIES = 5
+OTHER = 'Other'
+# кодировщики для столбцов с большим числом значений (city, postal_code, customer_id, title...):
+# ширина выхода не зависит от числа значений, все считается по кодам категорий, а не по строкам
+HASH_BUCKETS = 32
+TARGET_FOLDS = 5
+TARGET_SMOOTHING = 20.0
+
+
+def _as_categorical(series: pd.Series) -> pd.Categorical:
+    # у category-столбцов (parquet) это представление без копии
+    if isinstance(series, pd.Categorical):
+        return series
+    return series.array if isinstance(series.dtype, pd.CategoricalDtype) else pd.Categorical(series)
+
+
+def ordinal_codes(series: pd.Series, order: list) -> np.ndarray:
+    # как OrdinalEncoder(categories=[order], unknown_value=-1): значения вне order и пропуски -> -1
+    return pd.Categorical(series, categories=order).codes.astype(np.int8)
+
+
+def group_rare(series: pd.Series, top: int = TOP_COUNTRIES, other: str = OTHER) -> pd.Categorical:
+    # top самых частых значений остаются, остальные (и пропуски) -> other; одна таблица перекодировки на категории
+    values = _as_categorical(series)
+    codes = values.codes
+    counts = np.bincount(codes[codes >= 0], minlength=len(values.categories))
+    keep = np.argsort(-counts, kind='stable')[:top]
+    keep = keep[counts[keep] > 0]
+
+    categories = sorted([str(values.categories[i]) for i in keep] + [other])
+    remap = np.full(len(values.categories) + 1, categories.index(other), dtype=np.int8)
+    for i in keep:
+        remap[i] = categories.index(str(values.categories[i]))
+    # код -1 (пропуск) берет последний элемент remap, то есть other
+    return pd.Categorical.from_codes(remap[codes], categories=categories)
+
+
+def _one_hot_columns(values: pd.Categorical, prefix: str):
+    # встречающиеся категории в порядке сортировки значений (как OneHotEncoder) и имена столбцов
+    present = np.flatnonzero(np.bincount(values.codes[values.codes >= 0], minlength=len(values.categories)))
+    order = sorted(present, key=lambda i: str(values.categories[i]))
+    return order, [f'{prefix}_{str(values.categories[i]).replace(" ", "_")}' for i in order]
+
+
+def add_one_hot(df: pd.DataFrame, prefix: str, series) -> list:
+    # столбцы prefix_<значение>, только для встречающихся значений;
+    # bool-маска переинтерпретируется как int8 без копии
+    values = _as_categorical(series)
+    order, names = _one_hot_columns(values, prefix)
+    for i, name in zip(order, names):
+        df[name] = (values.codes == i).view(np.int8)
+    return names
+
+
+def codes_csr(codes: np.ndarray, n_columns: int) -> sparse.csr_matrix:
+    # one-hot из номеров столбцов: одна единица на строку, indptr/indices прямо из кодов; код -1 - пустая строка
+    filled = codes >= 0
+    indptr = np.r_[0, np.cumsum(filled)].astype(np.int64)
+    indices = codes[filled].astype(np.int32)
+    data = np.ones(len(indices), dtype=np.float64)
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(codes), n_columns))
+
+
+def one_hot_csr(series, prefix: str):
+    # тот же one-hot, что add_one_hot, но сразу CSR. строки с пропуском остаются пустыми
+    values = _as_categorical(series)
+    order, names = _one_hot_columns(values, prefix)
+    column = np.full(len(values.categories) + 1, -1, dtype=np.int32)
+    column[order] = np.arange(len(order), dtype=np.int32)
+    # код -1 (пропуск) берет последний элемент column, то есть -1
+    return codes_csr(column[values.codes], len(order)), names
+
+
+def _hash_values(categories: pd.Index) -> np.ndarray:
+    # хэш строкового представления: одинаковый между процессами и не зависит от состава словаря
+    return pd.util.hash_array(np.asarray(categories.astype(str), dtype=object))
+
+
+def hashed_csr(series, prefix: str, buckets: int = HASH_BUCKETS):
+    # hashing trick: значение -> корзина hash % buckets со знаком из другого бита хэша (коллизии гасят друг друга,
+    # а не копятся). хэшируются только различные значения, строки получают корзину по коду категории
+    values = _as_categorical(series)
+    hashes = _hash_values(values.categories)
+    bucket = np.r_[(hashes % np.uint64(buckets)).astype(np.int32), -1]
+    sign = np.r_[1.0 - 2.0 * ((hashes >> np.uint64(32)) & np.uint64(1)).astype(np.float64), 0.0]
+    x = codes_csr(bucket[values.codes], buckets)
+    x.data *= sign[values.codes][values.codes >= 0]
+    return x, [f'{prefix}_hash{i}' for i in range(buckets)]
+
+
+def frequency_table(series) -> pd.Series:
+    # доля строк каждого значения
+    values = _as_categorical(series)
+    counts = np.bincount(values.codes[values.codes >= 0], minlength=len(values.categories))
+    return pd.Series(counts / max(len(values), 1), index=values.categories)
+
+
+def lookup(series, table: pd.Series, default: float = 0.0) -> np.ndarray:
+    # значение из таблицы (индекс - значения столбца) через коды категорий; незнакомые и пропуски -> default
+    codes = pd.Categorical(series, categories=table.index).codes
+    return np.r_[table.to_numpy(dtype=np.float64), default][codes]
+
+
+def target_table(series, y, smoothing: float = TARGET_SMOOTHING):
+    # сглаженное среднее таргета по значению: (sum + prior * m) / (count + m); возвращает (таблица, prior)
+    values = _as_categorical(series)
+    y = np.asarray(y, dtype=np.float64)
+    filled = values.codes >= 0
+    counts = np.bincount(values.codes[filled], minlength=len(values.categories))
+    sums = np.bincount(values.codes[filled], weights=y[filled], minlength=len(values.categories))
+    prior = y.mean()
+    return pd.Series((sums + prior * smoothing) / (counts + smoothing), index=values.categories), prior
+
+
+def group_folds(groups, folds: int = TARGET_FOLDS) -> np.ndarray:
+    # фолд по хэшу ключа группы (rental_id): у аренды один и тот же фолд в любом чанке и в любом запуске,
+    # поэтому сохраненные out-of-fold таблицы подходят и для строк, которые придут позже
+    hashes = pd.util.hash_array(np.asarray(groups))
+    return ((hashes >> np.uint64(32)) % np.uint64(folds)).astype(np.int64)
+
+
+def target_fold_tables(series, y, fold: np.ndarray, folds: int = TARGET_FOLDS,
+                       smoothing: float = TARGET_SMOOTHING) -> np.ndarray:
+    # (фолд, значение) -> сглаженное среднее таргета по остальным фолдам; последний столбец - пропуски
+    # и незнакомые значения (prior фолда). значения - категории series в том же порядке, что у target_table.
+    # счетчики (фолд, значение) считаются одним bincount, "все минус свой фолд" - вычитанием
+    values = _as_categorical(series)
+    y = np.asarray(y, dtype=np.float64)
+    n_values = len(values.categories) + 1
+    codes = np.where(values.codes >= 0, values.codes, n_values - 1)
+
+    flat = fold * n_values + codes
+    counts = np.bincount(flat, minlength=folds * n_values).reshape(folds, n_values)
+    sums = np.bincount(flat, weights=y, minlength=folds * n_values).reshape(folds, n_values)
+    out_counts = counts.sum(axis=0) - counts
+    out_sums = sums.sum(axis=0) - sums
+    prior = out_sums.sum(axis=1) / np.maximum(out_counts.sum(axis=1), 1)
+
+    encoded = (out_sums + prior[:, None] * smoothing) / (out_counts + smoothing)
+    encoded[:, -1] = prior
+    return encoded
+
+
+def target_encode_oof(series, y, folds: int = TARGET_FOLDS, smoothing: float = TARGET_SMOOTHING,
+                      seed: int = 42, groups=None) -> np.ndarray:
+    # out-of-fold: строка кодируется статистиками остальных фолдов, чтобы модель не видела свой же таргет.
+    # groups - ключ строк с общим таргетом (rental_id: аренда повторяется по платежам и актерам фильма),
+    # фолд выдается группе целиком, иначе копии строки из других фолдов приносят ее таргет обратно
+    values = _as_categorical(series)
+    if groups is None:
+        fold = np.random.default_rng(seed).permutation(len(values)) % folds
+    else:
+        fold = group_folds(groups, folds)
+    codes = np.where(values.codes >= 0, values.codes, len(values.categories))
+    return target_fold_tables(values, y, fold, folds, smoothing)[fold, codes]
+
 
 def encode(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    rating_order = ['G', 'PG', 'PG-13', 'R', 'NC-17']
-    df['rating_encoded'] = OrdinalEncoder(
-        categories=[rating_order],
-        handle_unknown='use_encoded_value',
-        unknown_value=-1
-    ).fit_transform(df[['rating']])
-
-    ohe = OneHotEncoder(sparse_output=False, dtype=np.int8, handle_unknown='ignore')
-    cat_encoded = ohe.fit_transform(df[['category']])
-    cat_names = [f'category_{cat.replace(" ", "_")}' for cat in ohe.categories_[0]]
-
-    top_countries = df['country'].value_counts().nlargest(5).index.tolist()
-    df['country_grouped'] = df['country'].apply(lambda x: x if x in top_countries else 'Other')
-    country_ohe = OneHotEncoder(sparse_output=False, dtype=np.int8, handle_unknown='ignore')
-    country_encoded = country_ohe.fit_transform(df[['country_grouped']])
-    country_names = [f'country_{c.replace(" ", "_")}' for c in country_ohe.categories_[0]]
-
-    df_encoded = pd.concat([
-        df.reset_index(drop=True),
-        pd.DataFrame(cat_encoded, columns=cat_names, index=df.index),
-        pd.DataFrame(country_encoded, columns=country_names, index=df.index)
-    ], axis=1)
-
-    return df_encoded
\ No newline at end of file
+    # кадр дополняется на месте и возвращается для цепочек; индекс не меняется
+    df['rating_encoded'] = ordinal_codes(df['rating'], RATING_ORDER)
+    df['country_grouped'] = group_rare(df['country'])
+    add_one_hot(df, 'category', df['category'])
+    add_one_hot(df, 'country', df['country_grouped'])
+    return df
+
+
+def encode_sparse(df: pd.DataFrame):
+    # разреженный вариант encode: rating_encoded и country_grouped дописываются в df,
+    # а one-hot блоки category и country возвращаются одной CSR-матрицей со своими именами
+    df['rating_encoded'] = ordinal_codes(df['rating'], RATING_ORDER)
+    df['country_grouped'] = group_rare(df['country'])
+    category, category_names = one_hot_csr(df['category'], 'category')
+    country, country_names = one_hot_csr(df['country_grouped'], 'country')
+    return df, sparse.hstack([category, country], format='csr'), category_names + country_names
+
+
+def model_matrix(numeric: pd.DataFrame, one_hot: sparse.csr_matrix) -> sparse.csr_matrix:
+    # числовые столбцы + one-hot в одну CSR float64 - формат, который без конвертаций берут
+    # StandardScaler(with_mean=False), LogisticRegression и KNeighborsClassifier
+    dense = sparse.csr_matrix(numeric.to_numpy(dtype=np.float64, na_value=np.nan))
+    return sparse.hstack([dense, one_hot], format='csr', dtype=np.float64)
@@ -0,0 +1,151 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# индекс по одному числовому столбцу: значения сортируются один раз на кадр,
+# а группировки (маски, категории) только выбирают из готового порядка.
+# медианы, квантили, ранги, Манн-Уитни и Краскел-Уоллис читают уже отсортированные данные
+
+
+def _average_ranks(sorted_values: np.ndarray):
+    # ранги 1..n по отсортированному массиву, при связях - средний ранг; плюс поправка на связи sum(t^3 - t)
+    n = len(sorted_values)
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    ties = np.diff(np.r_[starts, n])
+    average = starts + (ties + 1) / 2
+    return np.repeat(average, ties), float((ties.astype(np.float64) ** 3 - ties).sum())
+
+
+class GroupIndex:
+    def __init__(self, values: pd.Series):
+        values = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        positions = np.flatnonzero(~np.isnan(values))
+        order = np.argsort(values[positions], kind='stable')
+        self.n_rows = len(values)
+        # номера строк в порядке возрастания значения (пропуски выкинуты) и сами значения в этом порядке
+        self.order = positions[order]
+        self.sorted_values = values[self.order]
+        self._groupings = {}
+
+    @cached_property
+    def ranks(self) -> tuple:
+        # (ранги по всем непропущенным строкам в порядке self.order, поправка на связи)
+        return _average_ranks(self.sorted_values)
+
+    def grouping(self, labels, name: str = None) -> 'Grouping':
+        # labels: категориальная Series или {название группы: булева маска}; строки вне групп не участвуют.
+        # с name группировка кэшируется в индексе
+        if name is not None and name in self._groupings:
+            return self._groupings[name]
+
+        if isinstance(labels, dict):
+            codes = np.full(self.n_rows, -1, dtype=np.int64)
+            for code, mask in enumerate(labels.values()):
+                codes[np.asarray(mask, dtype=bool) & (codes < 0)] = code
+            names = list(labels)
+        else:
+            codes, names = pd.factorize(labels, sort=True)
+            names = list(names)
+
+        grouping = Grouping(self, codes, names)
+        if name is not None:
+            self._groupings[name] = grouping
+        return grouping
+
+
+class Grouping:
+    def __init__(self, index: GroupIndex, codes: np.ndarray, names: list):
+        self.index = index
+        self.names = names
+        group_sorted = codes[index.order]
+        keep = group_sorted >= 0
+        # отсортированные значения только строк, попавших в группы - подпоследовательность, без новой сортировки
+        self.values = index.sorted_values[keep]
+        self.codes = group_sorted[keep]
+        self.sizes = np.bincount(self.codes, minlength=len(names))
+        # стабильная сортировка по номеру группы (radix для целых) оставляет значения внутри группы отсортированными
+        self._by_group = np.argsort(self.codes, kind='stable')
+        self.bounds = np.r_[0, np.cumsum(self.sizes)]
+        self._grouped = self.values[self._by_group]
+
+    def group(self, i: int) -> np.ndarray:
+        # отсортированные значения группы (представление, без копии)
+        return self._grouped[self.bounds[i]:self.bounds[i + 1]]
+
+    def groups(self) -> list:
+        return [self.group(i) for i in range(len(self.names))]
+
+    def quantiles(self, q) -> dict:
+        # как np.quantile(method='linear'), но по уже отсортированным значениям
+        result = {}
+        for name, values in zip(self.names, self.groups()):
+            if not len(values):
+                result[name] = np.full(np.shape(q), np.nan)
+                continue
+            position = np.asarray(q, dtype=np.float64) * (len(values) - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.minimum(low + 1, len(values) - 1)
+            result[name] = values[low] + (values[high] - values[low]) * (position - low)
+        return result
+
+    def medians(self) -> dict:
+        return {name: float(value) for name, value in self.quantiles(0.5).items()}
+
+    @cached_property
+    def _ranks(self):
+        # если группы покрывают все строки индекса - готовые ранги индекса, иначе пересчет по подпоследовательности
+        if len(self.values) == len(self.index.sorted_values):
+            return self.index.ranks
+        return _average_ranks(self.values)
+
+    def rank_sums(self) -> np.ndarray:
+        return np.bincount(self.codes, weights=self._ranks[0], minlength=len(self.names))
+
+    def encoded(self):
+        # различные значения + коды значений по группам, в формате resampling (np.unique здесь не нужен)
+        distinct = np.r_[True, self.values[1:] != self.values[:-1]]
+        value_codes = np.cumsum(distinct) - 1
+        grouped_codes = value_codes[self._by_group]
+        return self.values[distinct], [grouped_codes[self.bounds[i]:self.bounds[i + 1]]
+                                       for i in range(len(self.names))]
+
+    def mann_whitney(self) -> dict:
+        # асимптотический двусторонний тест с поправкой на связи и непрерывность, как scipy mannwhitneyu
+        n1, n2 = self.sizes[:2]
+        n = n1 + n2
+        ties = self._ranks[1]
+        u1 = self.rank_sums()[0] - n1 * (n1 + 1) / 2
+        u = max(u1, n1 * n2 - u1)
+        mu = n1 * n2 / 2
+        sigma = np.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+        z = (u - mu - 0.5) / sigma
+        return {'statistic': float(u1), 'p_value': float(min(2 * stats.norm.sf(z), 1.0))}
+
+    def kruskal(self) -> dict:
+        n = self.sizes.sum()
+        sizes = self.sizes[self.sizes > 0]
+        rank_sums = self.rank_sums()[self.sizes > 0]
+        h = 12 / (n * (n + 1)) * (rank_sums ** 2 / sizes).sum() - 3 * (n + 1)
+        h /= 1 - self._ranks[1] / (n ** 3 - n)
+        return {'statistic': float(h), 'p_value': float(stats.chi2.sf(h, len(sizes) - 1))}
+
+
+if __name__ == "__main__":
+    # сверка с scipy на дискретных данных со связями
+    rng = np.random.default_rng(0)
+    amount = pd.Series(rng.choice([0.99, 2.99, 4.99, np.nan], 50_000))
+    rating = pd.Series(rng.choice(['G', 'PG', 'R'], 50_000))
+    index = GroupIndex(amount)
+
+    by_rating = index.grouping(rating)
+    groups = [amount[rating == name].dropna() for name in by_rating.names]
+    print(by_rating.kruskal(), stats.kruskal(*groups).pvalue)
+    print(by_rating.medians(), [g.median() for g in groups])
+
+    # группы покрывают не все строки - ранги пересчитываются по подпоследовательности
+    pair = index.grouping({'G': rating == 'G', 'R': rating == 'R'})
+    g, r = amount[rating == 'G'].dropna(), amount[rating == 'R'].dropna()
+    result = stats.mannwhitneyu(g, r)
+    print(pair.mann_whitney(), result.statistic, result.pvalue)
@@ -1,38 +1,108 @@
+import warnings
+
 import numpy as np
 import pandas as pd
 
-from lab_2.utils.encoding import encode
-from lab_2.utils.new_features import create_features
+# квантили, которые достаются из одной сортировки блока
+QUANTILES = {'q0.1': 0.1, 'q1': 0.25, 'median': 0.5, 'q3': 0.75, 'q0.9': 0.9}
+
+
+def _numeric_block(df: pd.DataFrame, columns: list) -> np.ndarray:
+    # столбец -> строка блока (k x n, C-порядок): все проходы идут по непрерывной памяти
+    block = np.empty((len(columns), len(df)), dtype=np.float64)
+    for i, column in enumerate(columns):
+        block[i] = df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    return block
+
+
+def _numeric_metrics(df: pd.DataFrame, columns: list) -> dict:
+    block = _numeric_block(df, columns)
+    n = block.shape[1]
+    valid = ~np.isnan(block)
+    count = valid.sum(axis=1)
+
+    with warnings.catch_warnings():
+        # пустые и полностью пропущенные столбцы дают nan, как в pandas, без предупреждений
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        mean = np.sum(block, axis=1, where=valid) / count
+        variance = np.sum((block - mean[:, None]) ** 2, axis=1, where=valid) / (count - 1)
+    variance[count < 2] = np.nan
+
+    # одна сортировка на месте (nan уходят в конец строки) дает min, max и все квантили сразу;
+    # быстрее, чем np.quantile / nanquantile по оси, и не зависит от пропусков
+    block.sort(axis=1)
+    rows = np.arange(len(columns))
+    last = np.maximum(count - 1, 0)
+    empty = count == 0
+
+    def at(position: np.ndarray) -> np.ndarray:
+        # линейная интерполяция между соседними порядковыми статистиками (method='linear', как в pandas)
+        if not n:
+            return np.full(len(columns), np.nan)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, last)
+        fraction = position - low
+        values = block[rows, low] + (block[rows, high] - block[rows, low]) * fraction
+        values[empty] = np.nan
+        return values
+
+    column_min = at(np.zeros(len(columns)))
+    column_max = at(last.astype(np.float64))
+    quantiles = {name: at(q * last) for name, q in QUANTILES.items()}
+
+    missing_pct = (n - count) / n * 100 if n else np.full(len(columns), np.nan)
+    results = {}
+    for i, column in enumerate(columns):
+        results[column] = {
+            'missing_pct': missing_pct[i],
+            'min': column_min[i],
+            'max': column_max[i],
+            'mean': mean[i],
+            'median': quantiles['median'][i],
+            'variance': variance[i],
+            'q0.1': quantiles['q0.1'][i],
+            'q0.9': quantiles['q0.9'][i],
+            'q1': quantiles['q1'][i],
+            'q3': quantiles['q3'][i]
+        }
+    return results
+
+
+def _categorical_metrics(series: pd.Series) -> dict:
+    # коды + bincount: nunique и мода за один проход, без двух вызовов mode()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        uniques = series.cat.categories
+    else:
+        # sort=True - при равных частотах мода берется наименьшая, как у pandas mode().iloc[0]
+        codes, uniques = pd.factorize(series, sort=True)
+
+    present = codes[codes >= 0]
+    counts = np.bincount(present, minlength=len(uniques))
+    return {
+        'missing_pct': (len(codes) - len(present)) / len(codes) * 100 if len(codes) else np.nan,
+        'n_unique': int(np.count_nonzero(counts)),
+        'mode': uniques[counts.argmax()] if len(present) else None
+    }
 
 
 def calculate_metrics(df: pd.DataFrame) -> dict:
     results = {}
 
     numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
-    for column in numeric_columns:
-        results[column] = {
-            'missing_pct': df[column].isna().mean() * 100,
-            'min': df[column].min(),
-            'max': df[column].max(),
-            'mean': df[column].mean(),
-            'median': df[column].median(),
-            'variance': df[column].var(),
-            'q0.1': df[column].quantile(0.1),
-            'q0.9': df[column].quantile(0.9),
-            'q1': df[column].quantile(0.25),
-            'q3': df[column].quantile(0.75)
-        }
+    if numeric_columns:
+        results.update(_numeric_metrics(df, numeric_columns))
 
     categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
     for column in categorical_columns:
-        results[column] = {
-            'missing_pct': df[column].isna().mean() * 100,
-            'n_unique': df[column].nunique(),
-            'mode': df[column].mode().iloc[0] if not df[column].mode().empty else None
-        }
+        results[column] = _categorical_metrics(df[column])
     return results
 
 if __name__ == "__main__":
+    # признаки и кодирование нужны только для демонстрации - сам движок зависит лишь от numpy и pandas
+    from lab_2.utils.encoding import encode
+    from lab_2.utils.new_features import create_features
+
     df_test = pd.read_csv("../data/optimized_sakila_pg.csv")
     df_test = create_features(df_test)
     df_test = encode(df_test)
@@ -40,4 +110,4 @@ if __name__ == "__main__":
     for col, stats in result.items():
         print(f"\n{col}:")
         for metric, value in stats.items():
-            print(f"  {metric}: {value:.2f}" if isinstance(value, float) else f"  {metric}: {value}")
\ No newline at end of file
+            print(f"  {metric}: {value:.2f}" if isinstance(value, float) else f"  {metric}: {value}")
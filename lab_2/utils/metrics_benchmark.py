@@ -0,0 +1,81 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from lab_2.utils.encoding import encode
+from lab_2.utils.metrics import calculate_metrics
+from lab_2.utils.new_features import create_features
+
+
+def calculate_metrics_loop(df: pd.DataFrame) -> dict:
+    # прежняя реализация (по столбцу, ~10 проходов на числовой столбец) - эталон для сравнения
+    results = {}
+
+    numeric_columns = df.select_dtypes(include=[np.number]).columns.tolist()
+    for column in numeric_columns:
+        results[column] = {
+            'missing_pct': df[column].isna().mean() * 100,
+            'min': df[column].min(),
+            'max': df[column].max(),
+            'mean': df[column].mean(),
+            'median': df[column].median(),
+            'variance': df[column].var(),
+            'q0.1': df[column].quantile(0.1),
+            'q0.9': df[column].quantile(0.9),
+            'q1': df[column].quantile(0.25),
+            'q3': df[column].quantile(0.75)
+        }
+
+    categorical_columns = df.select_dtypes(include=['object', 'category']).columns.tolist()
+    for column in categorical_columns:
+        results[column] = {
+            'missing_pct': df[column].isna().mean() * 100,
+            'n_unique': df[column].nunique(),
+            'mode': df[column].mode().iloc[0] if not df[column].mode().empty else None
+        }
+    return results
+
+
+def best_time(func, df: pd.DataFrame, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(df)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def check_same(expected: dict, actual: dict):
+    assert list(expected) == list(actual), "разный набор столбцов"
+    for column, stats in expected.items():
+        assert list(stats) == list(actual[column]), f"{column}: разный набор метрик"
+        for metric, value in stats.items():
+            other = actual[column][metric]
+            if value is not None and pd.isna(value):
+                # pd.NA у nullable-столбцов и nan в блоке - одно и то же
+                assert other is not None and pd.isna(other), f"{column}.{metric}: {value} != {other}"
+            elif isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                # float32-столбцы pandas считает в float32, блок - в float64
+                assert np.isclose(value, other, rtol=1e-5, equal_nan=True), f"{column}.{metric}: {value} != {other}"
+            else:
+                assert value == other, f"{column}.{metric}: {value} != {other}"
+
+
+if __name__ == "__main__":
+    columns = [
+        'rental_id', 'rental_date', 'return_date', 'customer_id', 'film_id',
+        'amount', 'rating', 'category', 'country', 'length'
+    ]
+    df = pd.read_parquet("../data/optimized_sakila_pg.parquet", columns=columns)
+    df = encode(create_features(df))
+    print("data: ", df.shape, "numeric:", len(df.select_dtypes(include=[np.number]).columns))
+
+    check_same(calculate_metrics_loop(df), calculate_metrics(df))
+    print("результаты совпадают")
+
+    loop_time = best_time(calculate_metrics_loop, df, repeats=3)
+    vector_time = best_time(calculate_metrics, df, repeats=3)
+    print(f"по столбцам: {loop_time:.3f} s")
+    print(f"векторно:    {vector_time:.3f} s")
+    print(f"ускорение:   x{loop_time / vector_time:.1f}")
@@ -1,18 +1,128 @@
+import hashlib
+import os
+import zipfile
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
-def create_features(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
+# реестр производных признаков: каждый объявляет входные столбцы (сырые или другие признаки)
+# и считается только когда его попросили. групповые признаки - через groupby().transform, без merge и копий кадра.
+# кэш на диске общий для lab_2 и lab_3: ключ - fingerprint датасета (content_fingerprint) + имя признака +
+# хэш версий всех признаков, от которых он зависит (поднятая версия rental_duration_days сбрасывает и late_return).
+# в записи лежат число строк, dtype и отпечаток индекса кадра - другая выборка строк или другой порядок не подойдут
+FEATURE_CACHE_DIR = Path(__file__).resolve().parents[2] / '.feature_cache'
+
+FEATURES = {}
+
 
+def feature(name: str, inputs: list, version: int = 1):
+    # version поднимается при изменении формулы - старый кэш перестает совпадать
+    def register(func):
+        FEATURES[name] = {'inputs': list(inputs), 'func': func, 'version': version}
+        return func
+    return register
+
+
+@feature('rental_duration_days', ['rental_date', 'return_date'])
+def rental_duration_days(df: pd.DataFrame) -> pd.Series:
     # длительность аренды в сутках
-    df['rental_duration_days'] = (pd.to_datetime(df['return_date']) - pd.to_datetime(df['rental_date'])).dt.total_seconds() / 86400
+    return (pd.to_datetime(df['return_date']) - pd.to_datetime(df['rental_date'])).dt.total_seconds() / 86400
+
 
+@feature('customer_value', ['customer_id', 'amount'])
+def customer_value(df: pd.DataFrame) -> pd.Series:
     # customer value - сколько денег принес клиент в нашу шарашкину контору
-    cv = df.groupby('customer_id')['amount'].sum().reset_index(name='customer_value')
-    df = df.merge(cv, on=['customer_id'], how="left")
+    return df.groupby('customer_id', observed=True, sort=False)['amount'].transform('sum')
 
+
+@feature('film_popularity', ['film_id', 'rental_id'])
+def film_popularity(df: pd.DataFrame) -> pd.Series:
     # film popularity - насколько популярен фильм (например чебурашка) исходя из кол-ва аренд
-    fp = df.groupby('film_id')['rental_id'].count().rename('film_popularity')
-    df = df.merge(fp, on=['film_id'], how="left")
+    return df.groupby('film_id', observed=True, sort=False)['rental_id'].transform('count')
+
+
+@feature('late_return', ['rental_duration_days', 'rental_duration'])
+def late_return(df: pd.DataFrame) -> pd.Series:
+    # опоздал ли клиент с возвратом (целевая переменная lab_3); без даты возврата - 0
+    return (df['rental_duration_days'] > df['rental_duration']).astype(np.int8)
+
+
+def _versions(name: str) -> list:
+    # (признак, версия) для name и всех признаков, от которых он зависит
+    closure = {name: FEATURES[name]['version']}
+    stack = [name]
+    while stack:
+        for column in FEATURES[stack.pop()]['inputs']:
+            if column in FEATURES and column not in closure:
+                closure[column] = FEATURES[column]['version']
+                stack.append(column)
+    return sorted(closure.items())
+
+
+def _cache_path(cache_dir: Path, fingerprint: str, name: str) -> Path:
+    digest = hashlib.sha1(repr(_versions(name)).encode()).hexdigest()[:12]
+    return Path(cache_dir) / f"{fingerprint}-{name}-{digest}.npz"
+
+
+def _index_digest(index: pd.Index) -> str:
+    # отпечаток порядка строк: у RangeIndex - границы, иначе хэш значений индекса
+    if isinstance(index, pd.RangeIndex):
+        return f"range({index.start}, {index.stop}, {index.step})"
+    return hashlib.sha1(pd.util.hash_array(index.to_numpy()).tobytes()).hexdigest()
+
+
+def _load_cached(path: Path, df: pd.DataFrame):
+    # значения признака или None, если записи нет, она битая или снята с других строк
+    try:
+        with np.load(path) as entry:
+            values = entry['values']
+            rows, dtype, index = int(entry['rows']), str(entry['dtype']), str(entry['index'])
+    except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+        # битый файл (например, от прерванного запуска) - просто промах кэша, он перезапишется
+        return None
+    if rows != len(df) or len(values) != rows or str(values.dtype) != dtype or index != _index_digest(df.index):
+        return None
+    return values
+
+
+def add_features(df: pd.DataFrame, names: list, fingerprint: str = None,
+                 cache_dir: Path = FEATURE_CACHE_DIR) -> pd.DataFrame:
+    # добавляет признаки names (и те признаки, от которых они зависят) прямо в df, без копии кадра.
+    # fingerprint передается, только если df - весь датасет в исходном порядке строк (иначе кэш не подходит)
+    def build(name: str, path: tuple = ()):
+        if name in df.columns:
+            return
+        if name not in FEATURES:
+            raise KeyError(f"Столбца '{name}' нет ни в данных, ни в реестре признаков")
+        if name in path:
+            raise ValueError(f"Циклическая зависимость признаков: {' -> '.join(path + (name,))}")
+
+        cached = _cache_path(cache_dir, fingerprint, name) if fingerprint else None
+        if cached is not None and cached.exists():
+            values = _load_cached(cached, df)
+            if values is not None:
+                df[name] = values
+                return
+
+        for column in FEATURES[name]['inputs']:
+            build(column, path + (name,))
+        df[name] = FEATURES[name]['func'](df)
+
+        if cached is not None:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            # пишем во временный файл и атомарно подменяем - прерванная запись не оставит полфайла под ключом
+            partial = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+            values = df[name].to_numpy()
+            with open(partial, 'wb') as f:
+                np.savez(f, values=values, rows=len(values), dtype=str(values.dtype), index=_index_digest(df.index))
+            os.replace(partial, cached)
+
+    for name in names:
+        build(name)
+    return df
 
 
-    return df
\ No newline at end of file
+def create_features(df: pd.DataFrame, fingerprint: str = None) -> pd.DataFrame:
+    # как add_features, дописывает столбцы во входной кадр (без копии) и возвращает его же
+    return add_features(df, ['rental_duration_days', 'customer_value', 'film_popularity'], fingerprint)
@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# перестановочные тесты и бутстрэп без предположений о нормальности.
+# ресэмпл хранится не строками, а счетчиками значений: тензор (batch, группы, различные значения).
+# в выручке и популярности фильмов всего десяток-сотня различных значений, поэтому перестановка -
+# это многомерное гипергеометрическое распределение счетчиков, а бутстрэп - мультиномиальное:
+# цена O(batch * группы * значения) вместо O(batch * строки). для непрерывных столбцов
+# (значений больше DISCRETE_LIMIT) строки перемешиваются честно и сворачиваются в счетчики через bincount.
+# пачки раздаются процессам, данные попадают в воркер один раз через initializer
+RESAMPLES = 20_000
+BATCH_ELEMENTS = 4_000_000  # элементов тензора счетчиков на пачку
+DISCRETE_LIMIT = 256
+
+
+def _sums(values: np.ndarray, counts: np.ndarray):
+    sizes = counts.sum(axis=-1)
+    return sizes, counts @ values
+
+
+def mean_diff(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    sizes, sums = _sums(values, counts)
+    means = sums / sizes
+    return means[:, 0] - means[:, 1]
+
+
+def median_diff(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # медиана по счетчикам: значения с рангами (n-1)//2 и n//2 через cumsum, как np.median
+    sizes = counts.sum(axis=-1, keepdims=True)
+    cumulative = np.cumsum(counts, axis=-1)
+    low = values[(cumulative > (sizes - 1) // 2).argmax(axis=-1)]
+    high = values[(cumulative > sizes // 2).argmax(axis=-1)]
+    medians = (low + high) / 2
+    return medians[:, 0] - medians[:, 1]
+
+
+def f_statistic(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # F из однофакторного ANOVA; значения центрируются, чтобы суммы квадратов не теряли точность
+    total = counts.sum(axis=(0, 1))
+    values = values - (total @ values) / total.sum()
+    sizes, sums = _sums(values, counts)
+    squares = counts @ values ** 2
+    n, k = sizes.sum(axis=1), counts.shape[1]
+    grand = sums.sum(axis=1) / n
+    ss_between = (sums ** 2 / sizes).sum(axis=1) - n * grand ** 2
+    ss_within = (squares - sums ** 2 / sizes).sum(axis=1)
+    return (ss_between / (k - 1)) / (ss_within / (n - k))
+
+
+# статистика: (различные значения (V,), счетчики (batch, группы, V)) -> (batch,)
+STATISTICS = {
+    'mean_diff': mean_diff,
+    'median_diff': median_diff,
+    'f_statistic': f_statistic,
+}
+
+_data = {}
+
+
+def _init_worker(values: np.ndarray, codes: list):
+    _data['values'] = values
+    _data['codes'] = codes
+    _data['counts'] = np.stack([np.bincount(c, minlength=len(values)) for c in codes])
+
+
+def _bincount_rows(codes: np.ndarray, n_values: int) -> np.ndarray:
+    # (batch, m) кодов -> (batch, V) счетчиков одним bincount
+    offsets = np.arange(len(codes))[:, None] * n_values
+    return np.bincount((codes + offsets).ravel(), minlength=len(codes) * n_values).reshape(len(codes), n_values)
+
+
+def _permutation_counts(rng, batch: int) -> np.ndarray:
+    group_counts = _data['counts']
+    k, n_values = group_counts.shape
+    sizes = group_counts.sum(axis=1)
+    counts = np.zeros((batch, k, n_values), dtype=np.int64)
+
+    if n_values <= DISCRETE_LIMIT:
+        # группы по очереди набирают свои n_g из оставшегося, значение за значением (hypergeometric по пачке)
+        remaining = np.broadcast_to(group_counts.sum(axis=0), (batch, n_values)).copy()
+        for g in range(k - 1):
+            need = np.full(batch, sizes[g])
+            left = remaining.sum(axis=1)
+            for v in range(n_values - 1):
+                left -= remaining[:, v]
+                drawn = rng.hypergeometric(remaining[:, v], left, need)
+                counts[:, g, v] = drawn
+                need -= drawn
+            counts[:, g, -1] = need
+            remaining -= counts[:, g]
+        counts[:, -1] = remaining
+    else:
+        block = rng.permuted(np.broadcast_to(np.concatenate(_data['codes']), (batch, sizes.sum())), axis=1)
+        bounds = np.r_[0, np.cumsum(sizes)]
+        for g in range(k):
+            counts[:, g] = _bincount_rows(block[:, bounds[g]:bounds[g + 1]], n_values)
+    return counts
+
+
+def _bootstrap_counts(rng, batch: int) -> np.ndarray:
+    group_counts = _data['counts']
+    k, n_values = group_counts.shape
+    counts = np.zeros((batch, k, n_values), dtype=np.int64)
+    for g, codes in enumerate(_data['codes']):
+        if n_values <= DISCRETE_LIMIT:
+            counts[:, g] = rng.multinomial(len(codes), group_counts[g] / len(codes), size=batch)
+        else:
+            counts[:, g] = _bincount_rows(codes[rng.integers(0, len(codes), (batch, len(codes)))], n_values)
+    return counts
+
+
+def _resample_batch(kind: str, statistic: str, batch: int, seed: np.random.SeedSequence) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    counts = _permutation_counts(rng, batch) if kind == 'permutation' else _bootstrap_counts(rng, batch)
+    return STATISTICS[statistic](_data['values'], counts)
+
+
+def encode_groups(groups: list):
+    # общие различные значения по всем группам + коды строк каждой группы.
+    # если группы уже отсортированы (group_index.Grouping.encoded), этот шаг можно пропустить
+    arrays = [np.asarray(g, dtype=np.float64) for g in groups]
+    values, codes = np.unique(np.concatenate(arrays), return_inverse=True)
+    return values, np.split(codes, np.cumsum([len(a) for a in arrays])[:-1])
+
+
+def _run(kind: str, encoded: tuple, statistic: str, resamples: int, workers: int, seed: int) -> np.ndarray:
+    values, codes = encoded
+    n_rows = sum(len(c) for c in codes)
+    batch = max(1, min(resamples, BATCH_ELEMENTS // max(len(codes) * len(values), n_rows)))
+    batches = [batch] * (resamples // batch) + ([resamples % batch] if resamples % batch else [])
+    # свой seed у каждой пачки - результат не зависит от числа процессов
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+    args = ([kind] * len(batches), [statistic] * len(batches), batches, seeds)
+
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers == 1:
+        _init_worker(values, codes)
+        return np.concatenate(list(map(_resample_batch, *args)))
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(values, codes)) as pool:
+        return np.concatenate(list(pool.map(_resample_batch, *args)))
+
+
+def observed(encoded: tuple, statistic: str) -> float:
+    values, codes = encoded
+    counts = np.stack([np.bincount(c, minlength=len(values)) for c in codes])[None]
+    return float(STATISTICS[statistic](values, counts)[0])
+
+
+def permutation_test(groups: list = None, statistic: str = 'mean_diff', resamples: int = RESAMPLES,
+                     alternative: str = 'two-sided', workers: int = None, seed: int = 42, encoded: tuple = None) -> dict:
+    # H0 - метки групп ничего не значат; p = доля перестановок со статистикой не менее экстремальной
+    encoded = encoded or encode_groups(groups)
+    value = observed(encoded, statistic)
+    null = _run('permutation', encoded, statistic, resamples, workers, seed)
+    # допуск на округление: перестановка с теми же счетчиками должна считаться не менее экстремальной
+    tolerance = 1e-9 * max(abs(value), 1.0)
+    if alternative == 'two-sided':
+        extreme = np.abs(null) >= abs(value) - tolerance
+    elif alternative == 'greater':
+        extreme = null >= value - tolerance
+    else:
+        extreme = null <= value + tolerance
+    p_value = (extreme.sum() + 1) / (resamples + 1)
+    return {'statistic': value, 'p_value': float(p_value), 'resamples': resamples}
+
+
+def bootstrap_ci(groups: list = None, statistic: str = 'mean_diff', resamples: int = RESAMPLES,
+                 confidence: float = 0.95, workers: int = None, seed: int = 42, encoded: tuple = None) -> dict:
+    # перцентильный доверительный интервал статистики
+    encoded = encoded or encode_groups(groups)
+    replicates = _run('bootstrap', encoded, statistic, resamples, workers, seed)
+    tail = (1 - confidence) / 2
+    low, high = np.quantile(replicates, [tail, 1 - tail])
+    return {'statistic': observed(encoded, statistic), 'ci_low': float(low), 'ci_high': float(high),
+            'confidence': confidence}
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+# сливаемые скетчи для потоковых метрик: состояние строится по чанкам/процессам
+# и объединяется через merge без доступа к исходным строкам
+TDIGEST_COMPRESSION = 400
+HLL_PRECISION = 14
+HEAVY_HITTERS = 256
+DISCRETE_VALUES = 1024
+
+
+class TDigest:
+    # merging t-digest со шкалой k1 = compression / (2pi) * arcsin(2q - 1).
+    # центроид занимает по q не больше pi * sqrt(q(1-q)) * 2 / compression, поэтому ошибка квантиля
+    # по рангу не больше pi / (2 * compression) (~0.4% при 400) в медиане и быстро падает к хвостам.
+    # пока точек меньше, чем центроидов, квантили точные (как pandas, method='linear')
+    def __init__(self, compression: float = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return self.weights.sum()
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other: 'TDigest'):
+        if not len(other.weights):
+            return
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        # все точки и центроиды сортируются вместе, номер кластера - floor(k(q)) по левому краю точки,
+        # дальше суммы по кластерам через reduceat - без цикла по точкам
+        order = np.argsort(means)
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        left = (np.cumsum(weights) - weights) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(np.clip(2 * left - 1, -1, 1))
+        cluster = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, cluster[1:] != cluster[:-1]])
+
+        cluster_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / cluster_weights
+        self.weights = cluster_weights
+
+    def quantile(self, q) -> np.ndarray:
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.weights):
+            return np.full(q.shape, np.nan)
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        # позиция q * (n - 1) в нумерации pandas; центр одиночной точки i - это i + 0.5
+        rank = q * (total - 1) + 0.5
+        x = np.r_[0.0, centers, total]
+        y = np.r_[self.min, self.means, self.max]
+        return np.interp(rank, x, y)
+
+
+class DiscreteValues:
+    # точные счетчики значений числового столбца, пока различных значений не больше capacity.
+    # у t-digest на столбцах из нескольких крупных атомов (replacement_cost, rental_rate) оценка
+    # попадает между соседними значениями, а по счетчикам квантили точные. при переполнении values = None
+    def __init__(self, capacity: int = DISCRETE_VALUES):
+        self.capacity = capacity
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def update(self, values: np.ndarray):
+        if self.values is None:
+            return
+        values, counts = np.unique(values, return_counts=True)
+        self._add(values, counts)
+
+    def merge(self, other: 'DiscreteValues'):
+        if self.values is None or other.values is None:
+            self.values = self.counts = None
+            return
+        self._add(other.values, other.counts)
+
+    def _add(self, values: np.ndarray, counts: np.ndarray):
+        values, inverse = np.unique(np.concatenate([self.values, values]), return_inverse=True)
+        if len(values) > self.capacity:
+            self.values = self.counts = None
+            return
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(values)).astype(np.int64)
+        self.values = values
+
+    def quantile(self, q) -> np.ndarray:
+        # то же, что np.quantile(method='linear') по развернутым значениям
+        q = np.asarray(q, dtype=np.float64)
+        total = self.counts.sum()
+        if not total:
+            return np.full(q.shape, np.nan)
+        position = q * (total - 1)
+        low = np.floor(position)
+        cumulative = np.cumsum(self.counts)
+        below = self.values[np.searchsorted(cumulative, low, side='right')]
+        above = self.values[np.searchsorted(cumulative, np.minimum(low + 1, total - 1), side='right')]
+        return below + (above - below) * (position - low)
+
+
+class HyperLogLog:
+    # 2^precision регистров по uint8, стандартная ошибка 1.04 / sqrt(2^precision) (~0.8% при 14);
+    # на малых кардинальностях работает linear counting, там оценка почти точная
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def update(self, values: pd.Series):
+        if not len(values):
+            return
+        # hash_pandas_object хэширует значения, а не коды категорий - одинаково во всех чанках и процессах
+        hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # номер первой единицы в оставшихся битах; rest < 2^50, frexp по float64 дает точную длину
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: 'HyperLogLog'):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+class HeavyHitters:
+    # Misra-Gries на capacity счетчиков, слияние по Agarwal et al.: счетчики складываются,
+    # из всех вычитается (capacity+1)-й по величине. недосчет любого значения не больше n / (capacity + 1),
+    # так что мода верная, если ее частота отрывается от второй больше чем на эту величину.
+    # пока различных значений не больше capacity - все счетчики точные
+    def __init__(self, capacity: int = HEAVY_HITTERS):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.int64)
+        self.exact = True
+
+    def update(self, values: pd.Series):
+        counts = values.value_counts(sort=False)
+        counts = counts[counts > 0]
+        self._add(pd.Series(counts.to_numpy(dtype=np.int64), index=counts.index.astype(object)))
+
+    def merge(self, other: 'HeavyHitters'):
+        self.exact = self.exact and other.exact
+        self._add(other.counts)
+
+    def _add(self, counts: pd.Series):
+        combined = self.counts.add(counts, fill_value=0).astype(np.int64)
+        if len(combined) > self.capacity:
+            threshold = combined.nlargest(self.capacity + 1).iloc[-1]
+            combined = combined[combined > threshold] - threshold
+            self.exact = False
+        self.counts = combined
+
+    def mode(self):
+        if self.counts.empty:
+            return None
+        # при равных частотах наименьшее значение, как pandas mode().iloc[0]
+        top = self.counts[self.counts == self.counts.max()]
+        return min(top.index)
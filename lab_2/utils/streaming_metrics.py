@@ -0,0 +1,229 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from lab_2.utils.sketches import (
+    DISCRETE_VALUES, HEAVY_HITTERS, HLL_PRECISION, TDIGEST_COMPRESSION, DiscreteValues, HeavyHitters, HyperLogLog,
+    TDigest
+)
+
+# потоковый вариант calculate_metrics: файл читается чанками, на каждый столбец - сливаемое состояние.
+# словарь результата тот же, что у calculate_metrics. точно совпадают missing_pct, min, max, mean и variance
+# (до ошибки округления float64); квантили точные, пока в столбце не больше DISCRETE_VALUES различных
+# значений, дальше - в пределах ошибки t-digest по рангу (см. TDigest);
+# n_unique точный до HEAVY_HITTERS значений, дальше - HyperLogLog (~0.8%); mode точная до HEAVY_HITTERS
+# значений, дальше верная, если частота моды отрывается от второй больше чем на n / (HEAVY_HITTERS + 1)
+CHUNK_SIZE = 100_000
+QUANTILES = {'q0.1': 0.1, 'q1': 0.25, 'median': 0.5, 'q3': 0.75, 'q0.9': 0.9}
+
+
+class NumericState:
+    def __init__(self, compression: float = TDIGEST_COMPRESSION):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.missing = 0
+        self.digest = TDigest(compression)
+        self.discrete = DiscreteValues(DISCRETE_VALUES)
+
+    def _add_moments(self, count: int, mean: float, m2: float):
+        # формула Chan et al. - Уэлфорд для слияния двух частей, а не по одной точке
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def update(self, values: np.ndarray):
+        valid = values[~np.isnan(values)]
+        self.missing += len(values) - len(valid)
+        if not len(valid):
+            return
+        # внутри чанка моменты двухпроходные по numpy, между чанками - слияние
+        mean = valid.mean()
+        self._add_moments(len(valid), mean, ((valid - mean) ** 2).sum())
+        self.min = min(self.min, valid.min())
+        self.max = max(self.max, valid.max())
+        self.digest.update(valid)
+        self.discrete.update(valid)
+
+    def merge(self, other: 'NumericState'):
+        self.missing += other.missing
+        self._add_moments(other.count, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.digest.merge(other.digest)
+        self.discrete.merge(other.discrete)
+
+    def result(self, rows: int) -> dict:
+        empty = self.count == 0
+        sketch = self.digest if self.discrete.values is None else self.discrete
+        quantiles = dict(zip(QUANTILES, sketch.quantile(list(QUANTILES.values()))))
+        return {
+            'missing_pct': self.missing / rows * 100 if rows else np.nan,
+            'min': np.nan if empty else self.min,
+            'max': np.nan if empty else self.max,
+            'mean': np.nan if empty else self.mean,
+            'median': quantiles['median'],
+            'variance': self.m2 / (self.count - 1) if self.count > 1 else np.nan,
+            'q0.1': quantiles['q0.1'],
+            'q0.9': quantiles['q0.9'],
+            'q1': quantiles['q1'],
+            'q3': quantiles['q3']
+        }
+
+
+class CategoricalState:
+    def __init__(self, precision: int = HLL_PRECISION, capacity: int = HEAVY_HITTERS):
+        self.missing = 0
+        self.unique = HyperLogLog(precision)
+        self.heavy = HeavyHitters(capacity)
+
+    def update(self, values: pd.Series):
+        present = values.dropna()
+        self.missing += len(values) - len(present)
+        self.unique.update(present)
+        self.heavy.update(present)
+
+    def merge(self, other: 'CategoricalState'):
+        self.missing += other.missing
+        self.unique.merge(other.unique)
+        self.heavy.merge(other.heavy)
+
+    def result(self, rows: int) -> dict:
+        # пока Misra-Gries не обрезал счетчики, он знает все значения - число уникальных точное
+        n_unique = len(self.heavy.counts) if self.heavy.exact else self.unique.estimate()
+        return {
+            'missing_pct': self.missing / rows * 100 if rows else np.nan,
+            'n_unique': n_unique,
+            'mode': self.heavy.mode()
+        }
+
+
+class MetricsState:
+    # состояние по всем столбцам; update - очередной чанк, merge - состояние другого чанка/процесса
+    def __init__(self, compression: float = TDIGEST_COMPRESSION, precision: int = HLL_PRECISION,
+                 capacity: int = HEAVY_HITTERS):
+        self.compression = compression
+        self.precision = precision
+        self.capacity = capacity
+        self.rows = 0
+        self.numeric = {}
+        self.categorical = {}
+
+    def update(self, df: pd.DataFrame):
+        if not self.numeric and not self.categorical:
+            # состав столбцов - как в calculate_metrics, по первому чанку
+            for column in df.select_dtypes(include=[np.number]).columns:
+                self.numeric[column] = NumericState(self.compression)
+            for column in df.select_dtypes(include=['object', 'category']).columns:
+                self.categorical[column] = CategoricalState(self.precision, self.capacity)
+
+        self.rows += len(df)
+        for column, state in self.numeric.items():
+            state.update(df[column].to_numpy(dtype=np.float64, na_value=np.nan))
+        for column, state in self.categorical.items():
+            state.update(df[column])
+
+    def merge(self, other: 'MetricsState'):
+        self.rows += other.rows
+        for states, other_states in ((self.numeric, other.numeric), (self.categorical, other.categorical)):
+            for column, state in other_states.items():
+                if column in states:
+                    states[column].merge(state)
+                else:
+                    states[column] = state
+
+    def result(self) -> dict:
+        results = {column: state.result(self.rows) for column, state in self.numeric.items()}
+        results.update({column: state.result(self.rows) for column, state in self.categorical.items()})
+        return results
+
+
+def iter_chunks(path: str, columns: list = None, chunk_size: int = CHUNK_SIZE):
+    if path.endswith('.parquet'):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_size)
+
+
+def _empty_result(path: str, columns: list = None) -> dict:
+    # в файле нет строк (и чанков): состав столбцов - по схеме, метрики - как у calculate_metrics на пустом кадре
+    state = MetricsState()
+    if path.endswith('.parquet'):
+        state.update(pq.read_table(path, columns=columns).to_pandas())
+    else:
+        state.update(pd.read_csv(path, usecols=columns, nrows=0))
+    return state.result()
+
+
+def streaming_metrics(path: str, columns: list = None, chunk_size: int = CHUNK_SIZE) -> dict:
+    state = MetricsState()
+    for chunk in iter_chunks(path, columns, chunk_size):
+        state.update(chunk)
+    return state.result() if state.rows else _empty_result(path, columns)
+
+
+def _row_groups_state(path: str, columns: list, row_groups: list, chunk_size: int) -> MetricsState:
+    state = MetricsState()
+    parquet = pq.ParquetFile(path)
+    for batch in parquet.iter_batches(batch_size=chunk_size, row_groups=row_groups, columns=columns):
+        state.update(batch.to_pandas())
+    return state
+
+
+def parallel_metrics(path: str, columns: list = None, workers: int = 4, chunk_size: int = CHUNK_SIZE) -> dict:
+    # row group'ы parquet раздаются процессам, частичные состояния сливаются в одно
+    n_groups = pq.ParquetFile(path).num_row_groups
+    if n_groups == 0:
+        # файл без row group'ов: процессы не нужны
+        return _empty_result(path, columns)
+    parts = [list(range(n_groups))[i::workers] for i in range(min(workers, n_groups))]
+    with ProcessPoolExecutor(len(parts)) as pool:
+        states = list(pool.map(_row_groups_state, [path] * len(parts), [columns] * len(parts), parts,
+                               [chunk_size] * len(parts)))
+
+    state = states[0]
+    for other in states[1:]:
+        state.merge(other)
+    return state.result() if state.rows else _empty_result(path, columns)
+
+
+if __name__ == "__main__":
+    # сверка с calculate_metrics на полной выгрузке
+    from lab_2.utils.metrics import calculate_metrics
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "../data/optimized_sakila_pg.parquet"
+    df = pd.read_parquet(path)
+    exact = calculate_metrics(df)
+    approx = streaming_metrics(path)
+    merged = parallel_metrics(path) if pq.ParquetFile(path).num_row_groups > 1 else approx
+
+    for name, result in (("streaming", approx), ("parallel", merged)):
+        worst_rank = 0.0
+        for column, stats in exact.items():
+            if 'median' in stats:
+                values = np.sort(df[column].dropna().to_numpy(dtype=np.float64))
+                for metric, q in QUANTILES.items():
+                    # ошибка по рангу: на сколько q вне интервала рангов, которые занимает оценка
+                    low = np.searchsorted(values, result[column][metric], side='left') / max(len(values) - 1, 1)
+                    high = (np.searchsorted(values, result[column][metric], side='right') - 1) / max(len(values) - 1, 1)
+                    worst_rank = max(worst_rank, low - q, q - high, 0.0)
+                for metric in ('missing_pct', 'min', 'max', 'mean', 'variance'):
+                    assert np.isclose(stats[metric], result[column][metric], rtol=1e-6, equal_nan=True), \
+                        f"{column}.{metric}: {stats[metric]} != {result[column][metric]}"
+            else:
+                assert stats['missing_pct'] == result[column]['missing_pct'], column
+                error = abs(result[column]['n_unique'] - stats['n_unique']) / max(stats['n_unique'], 1)
+                print(f"{name}: {column} n_unique {result[column]['n_unique']} (точно {stats['n_unique']}, "
+                      f"ошибка {error:.2%}), mode {result[column]['mode']} (точно {stats['mode']})")
+        print(f"{name}: худшая ошибка квантилей по рангу {worst_rank:.4f} "
+              f"(граница {np.pi / (2 * TDIGEST_COMPRESSION):.4f})")
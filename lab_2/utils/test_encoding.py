@@ -0,0 +1,87 @@
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lab_2.utils.encoding import RATING_ORDER, encode
+
+# пиковый расход памяти (tracemalloc): кодирование держит в памяти только свои выходы, а не копии входного кадра.
+# сами выходы (22 one-hot столбца int8 + коды) на этом узком кадре весят ~1.4 его размера,
+# поэтому граница - 2 размера входа (прежняя реализация - ~7.7)
+# запуск из корня репозитория: python -m pytest lab_2
+MAX_PEAK_RATIO = 2.0
+ROWS = 200_000
+CATEGORIES = ['Action', 'Animation', 'Children', 'Classics', 'Comedy', 'Documentary', 'Drama', 'Family',
+              'Foreign', 'Games', 'Horror', 'Music', 'New', 'Sci-Fi', 'Sports', 'Travel']
+
+
+def legacy_encode(df: pd.DataFrame) -> pd.DataFrame:
+    # прежняя реализация: copy + apply + три concat'а
+    from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+    df = df.copy()
+    df['rating_encoded'] = OrdinalEncoder(categories=[RATING_ORDER], handle_unknown='use_encoded_value',
+                                          unknown_value=-1).fit_transform(df[['rating']])
+    ohe = OneHotEncoder(sparse_output=False, dtype=np.int8, handle_unknown='ignore')
+    cat_encoded = ohe.fit_transform(df[['category']])
+    cat_names = [f'category_{cat.replace(" ", "_")}' for cat in ohe.categories_[0]]
+    top_countries = df['country'].value_counts().nlargest(5).index.tolist()
+    df['country_grouped'] = df['country'].apply(lambda x: x if x in top_countries else 'Other')
+    country_ohe = OneHotEncoder(sparse_output=False, dtype=np.int8, handle_unknown='ignore')
+    country_encoded = country_ohe.fit_transform(df[['country_grouped']])
+    country_names = [f'country_{c.replace(" ", "_")}' for c in country_ohe.categories_[0]]
+    return pd.concat([
+        df.reset_index(drop=True),
+        pd.DataFrame(cat_encoded, columns=cat_names, index=df.index),
+        pd.DataFrame(country_encoded, columns=country_names, index=df.index)
+    ], axis=1)
+
+
+def peak_ratio(func, df: pd.DataFrame) -> float:
+    size = df.memory_usage(deep=True).sum()
+    tracemalloc.start()
+    try:
+        func(df)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / size
+
+
+@pytest.fixture(scope='module')
+def source() -> pd.DataFrame:
+    # синтетика в типах parquet-выгрузки: 100 стран, из них 10 частых
+    rng = np.random.default_rng(42)
+    countries = [f'Country {i}' for i in range(100)]
+    return pd.DataFrame({
+        'amount': rng.choice([0.99, 2.99, 4.99], ROWS).astype(np.float32),
+        'length': rng.integers(46, 186, ROWS).astype(np.int16),
+        'rental_date': pd.Timestamp('2005-05-24') + pd.to_timedelta(rng.integers(0, 10 ** 7, ROWS), unit='s'),
+        'rating': pd.Categorical(rng.choice(RATING_ORDER, ROWS), categories=RATING_ORDER),
+        'category': pd.Categorical(rng.choice(CATEGORIES, ROWS)),
+        'country': pd.Categorical(rng.choice(countries, ROWS, p=np.r_[np.full(10, 0.05), np.full(90, 0.5 / 90)])),
+    })
+
+
+def test_matches_legacy_encode(source):
+    # тот же результат, что у прежней реализации (по значениям столбцов)
+    expected = legacy_encode(source)
+    actual = encode(source.copy())
+    assert list(actual.columns) == list(expected.columns)
+    for column in expected.columns[len(source.columns):]:
+        left, right = actual[column], expected[column]
+        if column == 'country_grouped':
+            left, right = left.astype(str), right.astype(str)
+        assert np.array_equal(left, right), column
+
+
+def test_filtered_index_keeps_rows_aligned(source):
+    # фильтрованный кадр (индекс с дырками) - строки не съезжают, в отличие от reset_index + concat
+    filtered = encode(source[source['amount'] > 1].copy())
+    assert filtered.notna().all().all()
+
+
+def test_peak_memory(source):
+    ratio = peak_ratio(lambda df: encode(df.copy(deep=False)), source)
+    assert ratio <= MAX_PEAK_RATIO, f"пиковая память {ratio:.2f} x входа"
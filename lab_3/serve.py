@@ -0,0 +1,286 @@
+import json
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from lab_3.utils import registry
+from lab_3.utils.preprocessor import Preprocessor
+
+# локальный сервис скоринга опозданий: модель и ее предобработка загружаются из реестра один раз при старте
+# (массивы модели - через mmap, несколько процессов сервиса делят одну копию в page cache).
+# каждый запрос (одна аренда или список) встает в очередь, фоновый поток собирает очередь в пачки
+# до MAX_BATCH строк или MAX_WAIT секунд ожидания и считает predict_proba одной матрицей на пачку.
+# POST /score - {поля аренды} -> {"proba", "late_return"} (или список -> список); поле не того типа - 400
+# GET /metrics - p50/p99 задержки, пропускная способность, средний размер пачки; GET /health - модель и схема
+# запуск из lab_3: python serve.py [модель из artifacts/registry] [порт] [версия]
+MAX_BATCH = 64
+MAX_WAIT = 0.005
+LATENCY_WINDOW = 10_000  # последних запросов для p50/p99
+REQUEST_TIMEOUT = 10.0
+THRESHOLD = 0.5
+PORT = 8000
+
+
+class LatencyStats:
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self.latencies = np.zeros(window)
+        self.finished = np.zeros(window)
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def record_request(self, latency: float, rows: int):
+        with self.lock:
+            slot = self.requests % self.window
+            self.latencies[slot], self.finished[slot] = latency, time.perf_counter()
+            self.requests += 1
+            self.rows += rows
+
+    def record_batch(self, size: int):
+        with self.lock:
+            self.batches += 1
+            self.batched_rows += size
+
+    def record_error(self):
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            n = min(self.requests, self.window)
+            latencies, finished = self.latencies[:n].copy(), self.finished[:n].copy()
+            uptime = time.perf_counter() - self.started
+            result = {'requests': self.requests, 'rows': self.rows, 'errors': self.errors, 'batches': self.batches,
+                      'mean_batch': self.batched_rows / self.batches if self.batches else 0.0,
+                      'uptime_s': uptime, 'throughput_rps': self.requests / uptime}
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if n else (0.0, 0.0)
+        # пропускная способность по окну последних запросов (без простоя до начала нагрузки)
+        span = finished.max() - finished.min() if n > 1 else 0.0
+        result.update({'p50_ms': float(p50), 'p99_ms': float(p99), 'recent_rps': (n - 1) / span if span else 0.0})
+        return result
+
+
+class MicroBatcher:
+    def __init__(self, score, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT, stats: LatencyStats = None):
+        # score: список строк (dict) -> массив вероятностей той же длины
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = stats or LatencyStats()
+        self._queue = queue.Queue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, row: dict) -> Future:
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def _next_batch(self) -> list:
+        # первая строка ждется без ограничения, дальше - пока не наберется max_batch или не выйдет max_wait
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                proba = self.score([row for row, _ in batch])
+            except Exception:
+                # строка, которую не поймала проверка в обработчике, не должна ронять всю пачку:
+                # пачка пересчитывается по одной строке, исключение получает только future плохой строки
+                self._score_each(batch)
+                continue
+            self.stats.record_batch(len(batch))
+            for (_, future), p in zip(batch, proba):
+                future.set_result(float(p))
+
+    def _score_each(self, batch: list):
+        for row, future in batch:
+            try:
+                p = self.score([row])[0]
+            except Exception as error:
+                future.set_exception(error)
+                continue
+            self.stats.record_batch(1)
+            future.set_result(float(p))
+
+
+def _as_number(column: str, value) -> float:
+    # bool - тоже int в python, а inf/nan (1e400, NaN в JSON) предобработка не заполнит
+    if isinstance(value, bool):
+        raise ValueError(f"field {column}: expected a number, got {value!r}")
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"field {column}: expected a number, got {value!r}") from None
+    if not np.isfinite(number):
+        raise ValueError(f"field {column}: expected a finite number, got {value!r}")
+    return number
+
+
+def _as_key(column: str, value, dtype):
+    if dtype.kind in 'iu':
+        number = _as_number(column, value)
+        if not number.is_integer():
+            raise ValueError(f"field {column}: expected an integer id, got {value!r}")
+        return int(number)
+    if dtype.kind == 'f':
+        return _as_number(column, value)
+    if isinstance(value, bool):
+        raise ValueError(f"field {column}: expected a string, got {value!r}")
+    return str(value)
+
+
+class Scorer:
+    def __init__(self, preprocessor: Preprocessor, model, name: str, scaler=None, version: int = None):
+        # scaler - у моделей потокового обучения масштаб отдельный, поверх transform(scaled=False)
+        self.preprocessor = preprocessor
+        self.model = model
+        self.name = name
+        self.scaler = scaler
+        self.version = version
+        tables = preprocessor.frequency_tables | preprocessor.target_tables
+        self.key_dtypes = {column: table.index.dtype for column, table in tables.items()}
+
+    @classmethod
+    def load(cls, name: str, version: int = None, registry_dir=registry.REGISTRY_DIR) -> 'Scorer':
+        loaded = registry.load(name, version, registry_dir=registry_dir)
+        return cls(loaded['preprocessor'], loaded['model'], loaded['meta']['name'], loaded['scaler'],
+                   loaded['meta']['version'])
+
+    def coerce(self, row: dict) -> dict:
+        # поля запроса -> значения для предобработки: числовые признаки приводятся к конечному float,
+        # ключи таблиц частот/target (customer_id, actor_id, title) - к типу ключей обученной таблицы
+        # ("5" и 5.0 -> 5 для целых id), иначе они не совпадут ни с одним ключом и молча получат prior.
+        # остальные поля должны быть скалярами JSON; лишние поля отбрасываются, отсутствующие - пропуски.
+        # ValueError - ответ 400 на этот запрос, до очереди
+        clean = {}
+        for column in self.preprocessor.input_columns:
+            value = row.get(column)
+            if isinstance(value, (dict, list)):
+                raise ValueError(f"field {column}: expected a scalar, got {type(value).__name__}")
+            if value is not None:
+                if column in self.preprocessor.numeric:
+                    value = _as_number(column, value)
+                elif column in self.key_dtypes:
+                    value = _as_key(column, value, self.key_dtypes[column])
+            clean[column] = value
+        return clean
+
+    def __call__(self, rows: list) -> np.ndarray:
+        # отсутствующие поля -> пропуски: предобработка заполняет их так же, как незнакомые значения
+        df = pd.DataFrame.from_records(rows, columns=self.preprocessor.input_columns)
+        if self.scaler is None:
+            x = self.preprocessor.transform(df)
+        else:
+            x = self.scaler.transform(self.preprocessor.transform(df, scaled=False))
+        return self.model.predict_proba(x)[:, 1]
+
+
+def make_handler(batcher: MicroBatcher, scorer: Scorer):
+    stats = batcher.stats
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive для генератора нагрузки
+
+        def _send(self, code: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/metrics':
+                self._send(200, stats.snapshot())
+            elif self.path == '/health':
+                self._send(200, {'model': scorer.name, 'version': scorer.version, 'schema_hash': scorer.preprocessor.schema_hash,
+                                 'max_batch': batcher.max_batch, 'max_wait': batcher.max_wait})
+            else:
+                self._send(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            start = time.perf_counter()
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path != '/score':
+                self._send(404, {'error': f'unknown path {self.path}'})
+                return
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._send(400, {'error': 'body is not JSON'})
+                return
+            rows = payload if isinstance(payload, list) else [payload]
+            if not rows or not all(isinstance(row, dict) for row in rows):
+                self._send(400, {'error': 'expected a rental object or a list of them'})
+                return
+
+            try:
+                rows = [scorer.coerce(row) for row in rows]
+            except ValueError as error:
+                self._send(400, {'error': str(error)})
+                return
+
+            futures = [batcher.submit(row) for row in rows]
+            try:
+                proba = [future.result(timeout=REQUEST_TIMEOUT) for future in futures]
+            except Exception as error:
+                stats.record_error()
+                self._send(500, {'error': str(error)})
+                return
+            stats.record_request(time.perf_counter() - start, len(rows))
+            scored = [{'proba': p, 'late_return': p > THRESHOLD} for p in proba]
+            self._send(200, scored if isinstance(payload, list) else scored[0])
+
+        def log_message(self, format, *args):
+            # без строки в stderr на каждый запрос
+            pass
+
+    return Handler
+
+
+def serve(name: str, port: int = PORT, max_batch: int = MAX_BATCH, max_wait: float = MAX_WAIT,
+          version: int = None, registry_dir=registry.REGISTRY_DIR) -> ThreadingHTTPServer:
+    scorer = Scorer.load(name, version, registry_dir)
+    batcher = MicroBatcher(scorer, max_batch, max_wait)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(batcher, scorer))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    models = registry.list_models()
+    if models.empty:
+        sys.exit(f"В {registry.REGISTRY_DIR} нет моделей - сначала запусти task_2.py")
+    name = sys.argv[1] if len(sys.argv) > 1 else models['model'].iloc[0]
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+    version = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    server = serve(name, port, version=version)
+    print(f"модель {name} (доступны: {', '.join(models['model'].unique())})")
+    print(f"http://127.0.0.1:{port}/score, /metrics, /health; пачки до {MAX_BATCH} строк / {MAX_WAIT * 1000:.0f} ms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
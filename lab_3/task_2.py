@@ -1,60 +1,98 @@
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import GroupShuffleSplit
 
+from lab_1.app.utils.fingerprint import content_fingerprint
+from lab_2.utils.new_features import add_features
 from lab_3.train import train_models
-from lab_3.utils.encode_features import encode_features
+from lab_3.train_streaming import SPLIT, split_keys
+from lab_3.utils.preprocessor import Preprocessor
+from lab_3.utils.registry import register
 from lab_3.utils.plots import class_distribution_plot, correlation_matrix_plot
 from lab_3.utils.result_compare import compare_results
-
-df = pd.read_csv("data/optimized_sakila_pg.csv")
-
-
-df = df[df['return_date'].notna()]
-
-df = encode_features(df)
-
-df['rental_duration_days'] = (pd.to_datetime(df['return_date']) - pd.to_datetime(df['rental_date'])).dt.total_seconds() / 86400
-df['late_return'] = (df['rental_duration_days'] > df['rental_duration']).astype(int)
-
-print(f"Строки: {len(df)} Столбцы: {df.shape[1]}")
-
-print("\nПропуски по столбцам")
-print(df.isnull().sum())
-
-print("\nБаланс классов (по задержкам возврата)")
-class_dist = df['late_return'].value_counts(normalize=True) * 100
-print(f"0 (вовремя): {class_dist[0]:.1f}%")
-print(f"1 (опоздал):  {class_dist[1]:.1f}%")
-
-class_distribution_plot(df, "late_return","вовремя", "опоздал", "Количество клиентов")
-
-correlation_matrix_plot(df, True)
-
-x = df.drop('late_return', axis=1)
-y = df['late_return']
-
-
-x_train, x_test, y_train, y_test = train_test_split(
-    x, y,
-    test_size=0.2,
-    random_state=42,
-    stratify=y
-)
-
-numeric_cols = x_train.select_dtypes(include=['number']).columns
-x_train_numeric = x_train[numeric_cols]
-x_test_numeric = x_test[numeric_cols]
-
-scaler = StandardScaler()
-x_train_scaled = scaler.fit_transform(x_train_numeric)
-x_test_scaled = scaler.transform(x_test_numeric)
-
-results = train_models(x_train_scaled, y_train, x_test_scaled, y_test, "вовремя", "опоздал")
-
-print("Сравнение алгоритмов")
-
-comparison_df = compare_results(results)
-
-print(comparison_df.to_string(index=False))
-
+from lab_3.utils.sweep import sweep
+
+# обученная предобработка сохраняется сюда и переиспользуется для скоринга новых аренд
+PREPROCESSOR_DIR = "artifacts/preprocessor"
+# подбор k/weights у KNN и C у логрегрессии на отложенной части обучающих строк
+SWEEP = True
+
+columns = [
+    'rental_date', 'return_date', 'rental_duration', 'length', 'rental_rate',
+    'replacement_cost', 'amount', 'rating', 'category', 'country',
+    # ключи с большим числом значений - hashing / частота / target-кодирование в предобработке
+    'city', 'postal_code', 'customer_id', 'actor_id', 'title',
+    # в выгрузке строка на (платеж, актер фильма) - копии одной аренды не должны разъезжаться по выборкам
+    'rental_id'
+]
+
+# пул процессов в train_models заново импортирует этот модуль (spawn), поэтому код - под guard
+if __name__ == "__main__":
+    data_path = "data/optimized_sakila_pg.parquet"
+    df = pd.read_parquet(data_path, columns=columns)
+
+    # признаки считаются по всему файлу (ключ кэша - fingerprint), поэтому до фильтрации строк
+    df = add_features(df, ['rental_duration_days', 'late_return'], fingerprint=content_fingerprint(data_path))
+
+    df = df[df['return_date'].notna()]
+
+    print(f"Строки: {len(df)} Столбцы: {df.shape[1]}")
+
+    print("\nПропуски по столбцам")
+    print(df.isnull().sum())
+
+    print("\nБаланс классов (по задержкам возврата)")
+    class_dist = df['late_return'].value_counts(normalize=True) * 100
+    print(f"0 (вовремя): {class_dist[0]:.1f}%")
+    print(f"1 (опоздал):  {class_dist[1]:.1f}%")
+
+    class_distribution_plot(df, "late_return","вовремя", "опоздал", "Количество клиентов")
+
+    correlation_matrix_plot(df, True)
+
+    y = df['late_return']
+    groups = df['rental_id'].to_numpy()
+
+    # делим номера строк по хэшу rental_id (как train_streaming): все копии аренды целиком в обучении
+    # или в тесте, а сохраненная предобработка не видела аренд, отложенных потоковым обучением
+    holdout, _ = split_keys(df['rental_id'])
+    train_idx, test_idx = np.flatnonzero(~holdout), np.flatnonzero(holdout)
+    y_train, y_test = y.iloc[train_idx], y.iloc[test_idx]
+    train_groups = groups[train_idx]
+
+    # словари, top стран, таблицы частот/таргета и масштаб запоминаются на обучении,
+    # тест кодируется в ту же раскладку (CSR); у обучающих строк target-столбцы out-of-fold
+    preprocessor = Preprocessor()
+    x_train_scaled = preprocessor.fit_transform(df.iloc[train_idx], y_train, train_groups, SPLIT)
+    x_test_scaled = preprocessor.transform(df.iloc[test_idx])
+    preprocessor.save(PREPROCESSOR_DIR)
+    print(f"Предобработка: {len(preprocessor.feature_names)} признаков, schema_hash {preprocessor.schema_hash}")
+
+    models = None
+    if SWEEP:
+        splitter = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+        fit_part, valid_part = next(splitter.split(np.arange(len(train_idx)), y_train, train_groups))
+        tuned = sweep(x_train_scaled[fit_part], y_train.iloc[fit_part],
+                      x_train_scaled[valid_part], y_train.iloc[valid_part])
+        for key in ('knn', 'lr'):
+            table = tuned[key]
+            print(f"\nПодбор {key}: {len(table)} конфигураций за {table.attrs['time']:.2f} s")
+            print(table.sort_values('roc_auc', ascending=False).head(5).to_string(index=False))
+        models = tuned['models']
+
+    results = train_models(x_train_scaled, y_train, x_test_scaled, y_test, "вовремя", "опоздал", models=models,
+                           groups=train_groups)
+
+    # итоговые модели вместе с предобработкой и метриками - в реестр (artifacts/registry), оттуда их берет serve.py
+    fingerprint = content_fingerprint(data_path)
+    for name, result in results.items():
+        metrics = {key: result[key] for key in ('accuracy', 'precision', 'recall', 'f1', 'roc_auc')}
+        metrics['cv_roc_auc'] = float(np.mean(result['cv_roc_auc'])) if result['cv_roc_auc'] else None
+        path = register(name, result['model'], preprocessor, metrics, fingerprint, result['fit_time'])
+        print(f"{name} -> {path}")
+
+    print("Сравнение алгоритмов")
+
+    comparison_df = compare_results(results)
+
+    print(comparison_df.to_string(index=False, float_format='%.3f'))
@@ -1,36 +1,141 @@
-from matplotlib import pyplot as plt
-import seaborn as sns
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, roc_auc_score, confusion_matrix, \
-    classification_report
+from sklearn.model_selection import StratifiedGroupKFold, StratifiedKFold
 from sklearn.neighbors import KNeighborsClassifier
+from threadpoolctl import threadpool_limits
+
+from lab_3.utils.evaluation import evaluate_thresholds, report
+from lab_3.utils.plots import confusion_matrices_plot
+
+# модели и фолды кросс-валидации обучаются параллельно в пуле процессов: задача - (модель, фолд),
+# фолд None - итоговое обучение на всей обучающей выборке с оценкой на тесте.
+# модель задается фабрикой (partial класса с параметрами), чтобы ее можно было передать воркеру.
+# матрицы пишутся один раз во временный каталог .npy и открываются воркерами через mmap (без копий и pickle),
+# CSR - тремя массивами data/indices/indptr
+MODELS = {
+    'Logistic Regression': partial(LogisticRegression, max_iter=1000, random_state=42),  # работает и без нормализации
+    'KNN (k=5)': partial(KNeighborsClassifier, n_neighbors=5),  # KNN требует нормализованные данные
+}
+CV_FOLDS = 5
+
+_data = {}
+
+
+def _as_model_input(x):
+    # CSR float64 с отсортированными индексами - в таком виде разреженную матрицу берут и логрегрессия, и KNN
+    # (brute-force по разреженным строкам), без своих конвертаций на каждый fit/predict; плотные - float64
+    if sparse.issparse(x):
+        x = sparse.csr_matrix(x, dtype=np.float64)
+        x.sort_indices()
+        return x
+    return np.ascontiguousarray(x, dtype=np.float64)
+
+
+def _save_matrix(directory: Path, name: str, x) -> dict:
+    if sparse.issparse(x):
+        for part in ('data', 'indices', 'indptr'):
+            np.save(directory / f'{name}_{part}.npy', getattr(x, part))
+        return {'name': name, 'sparse': True, 'shape': x.shape}
+    np.save(directory / f'{name}.npy', x)
+    return {'name': name, 'sparse': False}
+
+
+def _open_matrix(directory: Path, spec: dict):
+    if spec['sparse']:
+        parts = [np.load(directory / f"{spec['name']}_{part}.npy", mmap_mode='r')
+                 for part in ('data', 'indices', 'indptr')]
+        return sparse.csr_matrix(tuple(parts), shape=spec['shape'], copy=False)
+    return np.load(directory / f"{spec['name']}.npy", mmap_mode='r')
+
+
+def _init_worker(directory: str, specs: dict):
+    # BLAS внутри воркера в один поток: параллельность уже на уровне процессов
+    threadpool_limits(1)
+    for key, spec in specs.items():
+        _data[key] = _open_matrix(Path(directory), spec)
+
 
+def _fit_task(name: str, factory, fold, train_idx: np.ndarray, valid_idx: np.ndarray) -> dict:
+    x, y = _data['x_train'], _data['y_train']
+    if fold is None:
+        x_fit, y_fit, x_eval = x, y, _data['x_test']
+    else:
+        x_fit, y_fit, x_eval = x[train_idx], y[train_idx], x[valid_idx]
 
-def train_models(x_train, y_train, x_test, y_test, target_1: str, target_2: str) -> dict:
-    models = {
-        'Logistic Regression': LogisticRegression(max_iter=1000, random_state=42),
-        'KNN (k=5)': KNeighborsClassifier(n_neighbors=5)
+    model = factory()
+    start = time.perf_counter()
+    model.fit(x_fit, y_fit)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    proba = model.predict_proba(x_eval)
+    predict_time = time.perf_counter() - start
+
+    # предсказания - порог по вероятности (как model.predict, но без второго прохода - у KNN это повторный поиск)
+    result = {'name': name, 'fold': fold, 'fit_time': fit_time, 'predict_time': predict_time}
+    if fold is None:
+        # итоговую модель возвращаем целиком - ее сохраняют для скоринга (serve.py)
+        result['y_proba'], result['model'] = proba[:, 1], model
+    else:
+        evaluation = evaluate_thresholds(y[valid_idx], proba[:, 1])
+        result['roc_auc'], result['f1'] = evaluation['roc_auc'], evaluation['at_threshold']['f1']
+    return result
+
+
+def _run_tasks(tasks: list, matrices: dict, workers: int) -> list:
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1:
+        _data.update(matrices)
+        return [_fit_task(*task) for task in tasks]
+
+    with tempfile.TemporaryDirectory() as directory:
+        specs = {key: _save_matrix(Path(directory), key, x) for key, x in matrices.items()}
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(directory, specs)) as pool:
+            return list(pool.map(_fit_task, *zip(*tasks)))
+
+
+def train_models(x_train, y_train, x_test, y_test, target_1: str, target_2: str, folds: int = CV_FOLDS,
+                 workers: int = None, show: bool = True, models: dict = None, groups=None) -> dict:
+    # x_train / x_test - плотные массивы или разреженные матрицы (one-hot в CSR).
+    # folds=0 - без кросс-валидации; workers=None - по числу ядер; models - {имя: фабрика}, по умолчанию MODELS;
+    # groups - ключ повторяющихся обучающих строк (rental_id): копии одной аренды попадают в один фолд
+    models = models or MODELS
+    matrices = {
+        'x_train': _as_model_input(x_train),
+        'y_train': np.asarray(y_train),
+        'x_test': _as_model_input(x_test),
     }
-    results = {}
+    y_test = np.asarray(y_test)
 
-    for name, model in models.items():
-        print(f"модель: {name} \n")
+    tasks = [(name, factory, None, None, None) for name, factory in models.items()]
+    if folds:
+        splitter = (StratifiedKFold if groups is None else StratifiedGroupKFold)(n_splits=folds, shuffle=True,
+                                                                                 random_state=42)
+        splits = list(splitter.split(np.zeros(len(matrices['y_train'])), matrices['y_train'], groups))
+        tasks += [(name, factory, fold, train_idx, valid_idx) for name, factory in models.items()
+                  for fold, (train_idx, valid_idx) in enumerate(splits)]
 
-        if 'KNN' in name:
-            model.fit(x_train, y_train)  # KNN требует нормализованные данные
-            y_pred = model.predict(x_test)
-            y_proba = model.predict_proba(x_test)[:, 1]
-        else:
-            model.fit(x_train, y_train)  # Лог. регрессия работает и без нормализации
-            y_pred = model.predict(x_test)
-            y_proba = model.predict_proba(x_test)[:, 1]
-
-        acc = accuracy_score(y_test, y_pred)
-        prec = precision_score(y_test, y_pred)
-        rec = recall_score(y_test, y_pred)
-        f1 = f1_score(y_test, y_pred)
-        roc = roc_auc_score(y_test, y_proba)
-        cm = confusion_matrix(y_test, y_pred)
+    start = time.perf_counter()
+    outputs = _run_tasks(tasks, matrices, workers)
+    print(f"обучение ({len(tasks)} задач): {time.perf_counter() - start:.2f} s")
+
+    results = {}
+    for name in models:
+        final = next(o for o in outputs if o['name'] == name and o['fold'] is None)
+        cv = sorted((o for o in outputs if o['name'] == name and o['fold'] is not None), key=lambda o: o['fold'])
+        y_proba = final['y_proba']
+        # все метрики, кривые и лучший порог - из одной сортировки вероятностей
+        evaluation = evaluate_thresholds(y_test, y_proba)
+        at = evaluation['at_threshold']
+        acc, prec, rec, f1, roc = at['accuracy'], at['precision'], at['recall'], at['f1'], evaluation['roc_auc']
 
         results[name] = {
             'accuracy': acc,
@@ -38,26 +143,34 @@ def train_models(x_train, y_train, x_test, y_test, target_1: str, target_2: str)
             'recall': rec,
             'f1': f1,
             'roc_auc': roc,
-            'confusion_matrix': cm,
-            'y_proba': y_proba
+            'confusion_matrix': at['confusion_matrix'],
+            'y_proba': y_proba,
+            'y_true': y_test,
+            'model': final['model'],
+            'evaluation': evaluation,
+            'fit_time': final['fit_time'],
+            'predict_time': final['predict_time'],
+            'cv_roc_auc': [o['roc_auc'] for o in cv],
+            'cv_f1': [o['f1'] for o in cv],
+            'fold_times': [{'fold': o['fold'], 'fit': o['fit_time'], 'predict': o['predict_time']} for o in cv],
         }
 
+        print(f"модель: {name} \n")
         print(f"Accuracy: {acc:.3f}")
         print(f"Precision: {prec:.3f}")
         print(f"Recall: {rec:.3f}")
         print(f"F1-score: {f1:.3f}")
         print(f"ROC-AUC: {roc:.3f}")
+        print(f"лучший F1: {evaluation['best_f1']:.3f} при пороге {evaluation['best_threshold']:.3f}")
+        if cv:
+            cv_roc = results[name]['cv_roc_auc']
+            print(f"CV ROC-AUC ({len(cv)} фолдов): {np.mean(cv_roc):.3f} ± {np.std(cv_roc):.3f}")
+            print("время по фолдам, s: " + ", ".join(f"{t['fit'] + t['predict']:.2f}"
+                                                      for t in results[name]['fold_times']))
         print("\nClassification Report:")
-        print(classification_report(y_test, y_pred, target_names=[target_1, target_2]))
-
-        plt.figure(figsize=(4, 3.5))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                    xticklabels=[target_1, target_2],
-                    yticklabels=[target_1, target_2])
-        plt.title(f'Confusion Matrix: {name}')
-        plt.ylabel('Истинный класс')
-        plt.xlabel('Предсказанный класс')
-        plt.tight_layout()
-        plt.show()
+        print(report(evaluation, target_1, target_2))
 
+    # все матрицы ошибок одной фигурой, один plt.show в конце
+    if show:
+        confusion_matrices_plot(results, target_1, target_2)
     return results
@@ -0,0 +1,159 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import SGDClassifier
+from sklearn.preprocessing import StandardScaler
+
+from lab_2.utils.new_features import add_features
+from lab_2.utils.streaming_metrics import iter_chunks
+from lab_3.utils.evaluation import evaluate_thresholds, report
+from lab_3.utils.preprocessor import FREQUENCY, HASHED, NUMERIC, TARGET, Preprocessor
+from lab_3.utils.registry import register
+
+# обучение без загрузки всего датасета: файл читается чанками, каждый чанк проходит через сохраненную
+# предобработку (без ее масштаба), StandardScaler.partial_fit и SGDClassifier(log_loss).partial_fit.
+# отложенная выборка - аренды, у которых хэш rental_id попал в HOLDOUT_PERCENT (не зависит от размера чанков,
+# все строки одной аренды по одну сторону); для оценки из нее хранится равномерная выборка RESERVOIR_SIZE строк.
+# то же разбиение (SPLIT) использует task_2, поэтому ее таблицы частот/target не видели отложенных аренд;
+# предобработка, обученная на другом разбиении, не принимается. обучающие строки получают out-of-fold target.
+# в памяти одновременно только чанк и резервуар, сколько бы ни было истории аренд
+CHUNK_ROWS = 50_000
+HOLDOUT_PERCENT = 20
+SPLIT = f"rental_id hash, holdout {HOLDOUT_PERCENT}%"
+RESERVOIR_SIZE = 20_000
+EVAL_EVERY = 5  # чанков между промежуточными оценками на резервуаре
+PREPROCESSOR_DIR = "artifacts/preprocessor"
+
+COLUMNS = sorted(set(NUMERIC + HASHED + FREQUENCY + TARGET
+                     + ['rating', 'category', 'country', 'rental_id', 'rental_date', 'return_date']))
+
+
+def split_keys(rental_id: pd.Series):
+    # (маска отложенных строк, приоритет в [0, 1) для резервуара) из одного хэша rental_id:
+    # младшие разряды решают holdout, старшие дают приоритет
+    hashes = pd.util.hash_array(rental_id.to_numpy())
+    holdout = hashes % np.uint64(100) < HOLDOUT_PERCENT
+    priority = (hashes >> np.uint64(11)).astype(np.float64) / 2.0 ** 53
+    return holdout, priority
+
+
+class Reservoir:
+    # равномерная выборка фиксированного размера из потока: у каждой строки случайный приоритет,
+    # хранятся size строк с наименьшим - то же, что выборка без возвращения из всего потока
+    def __init__(self, size: int = RESERVOIR_SIZE):
+        self.size = size
+        self.x = None
+        self.y = np.empty(0, dtype=np.int8)
+        self.priority = np.empty(0)
+
+    def add(self, x: sparse.csr_matrix, y: np.ndarray, priority: np.ndarray):
+        if self.x is not None:
+            x = sparse.vstack([self.x, x], format='csr')
+            y, priority = np.r_[self.y, y], np.r_[self.priority, priority]
+        if len(priority) > self.size:
+            keep = np.sort(np.argpartition(priority, self.size - 1)[:self.size])
+            x, y, priority = x[keep], y[keep], priority[keep]
+        self.x, self.y, self.priority = x, y, priority
+
+
+def _late_return_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    # признаки построчные, поэтому считаются на чанке без кэша
+    chunk = chunk[chunk['return_date'].notna()]
+    return add_features(chunk, ['late_return'])
+
+
+def train_streaming(path: str, preprocessor: Preprocessor = None, chunk_size: int = CHUNK_ROWS,
+                    reservoir_size: int = RESERVOIR_SIZE, epochs: int = 1, seed: int = 42) -> dict:
+    # preprocessor=None - предобработка обучается на обучающих строках первого чанка
+    if preprocessor is not None and preprocessor.split != SPLIT:
+        raise ValueError(f"Предобработка обучена на разбиении {preprocessor.split!r}, а отложенная выборка - "
+                         f"{SPLIT!r}: таблицы target могли видеть отложенные аренды")
+    scaler = StandardScaler(with_mean=False)
+    model = SGDClassifier(loss='log_loss', alpha=1e-4, random_state=seed)
+    reservoir = Reservoir(reservoir_size)
+    classes = np.array([0, 1])
+    history, rows, peak_chunk = [], 0, 0
+    start = time.perf_counter()
+
+    for epoch in range(epochs):
+        for i, chunk in enumerate(iter_chunks(path, COLUMNS, chunk_size)):
+            chunk = _late_return_chunk(chunk)
+            y = chunk['late_return'].to_numpy()
+            holdout, priority = split_keys(chunk['rental_id'])
+            train = ~holdout
+            groups = chunk['rental_id'].to_numpy()[train]
+            if preprocessor is None:
+                if not train.any():
+                    # предобработку не на чем обучить - чанк пропускается целиком
+                    continue
+                preprocessor = Preprocessor().fit(chunk[train], y[train], groups, SPLIT)
+
+            # в маленьком чанке все аренды могут оказаться по одну сторону разбиения
+            if epoch == 0 and holdout.any():
+                reservoir.add(preprocessor.transform(chunk[holdout], scaled=False), y[holdout], priority[holdout])
+            if train.any():
+                # обучающие строки - out-of-fold target по фолду аренды, отложенные - по полным таблицам
+                x = preprocessor.transform(chunk[train], scaled=False, groups=groups)
+                peak_chunk = max(peak_chunk, x.data.nbytes + x.indices.nbytes + x.indptr.nbytes)
+                if epoch == 0:
+                    scaler.partial_fit(x)
+                model.partial_fit(scaler.transform(x), y[train], classes=classes)
+                rows += int(train.sum())
+
+            if (i + 1) % EVAL_EVERY == 0 and rows and reservoir.x is not None:
+                proba = model.predict_proba(scaler.transform(reservoir.x))[:, 1]
+                history.append({'epoch': epoch, 'chunk': i + 1, 'rows': rows,
+                                'roc_auc': evaluate_thresholds(reservoir.y, proba)['roc_auc']})
+
+    if not rows:
+        raise ValueError(f"В {path} нет обучающих аренд с датой возврата")
+    if reservoir.x is None:
+        raise ValueError(f"В {path} нет отложенных аренд (хэш rental_id < {HOLDOUT_PERCENT}%) - оценивать не на чем")
+    y_proba = model.predict_proba(scaler.transform(reservoir.x))[:, 1]
+    evaluation = evaluate_thresholds(reservoir.y, y_proba)
+    at = evaluation['at_threshold']
+    result = {
+        'accuracy': at['accuracy'],
+        'precision': at['precision'],
+        'recall': at['recall'],
+        'f1': at['f1'],
+        'roc_auc': evaluation['roc_auc'],
+        'confusion_matrix': at['confusion_matrix'],
+        'y_proba': y_proba,
+        'y_true': reservoir.y,
+        'evaluation': evaluation,
+        'fit_time': time.perf_counter() - start,
+    }
+    return {'results': {'SGD (log_loss, stream)': result}, 'model': model, 'scaler': scaler,
+            'preprocessor': preprocessor, 'history': history, 'rows': rows,
+            'memory': {'chunk': peak_chunk, 'reservoir': reservoir.x.data.nbytes + reservoir.x.indices.nbytes
+                       + reservoir.x.indptr.nbytes}}
+
+
+if __name__ == "__main__":
+    from lab_1.app.utils.fingerprint import content_fingerprint
+    from lab_3.utils.result_compare import compare_results
+
+    data_path = "data/optimized_sakila_pg.parquet"
+    # сохраненная в task_2 предобработка, если есть - те же словари и раскладка, что у обычного обучения
+    preprocessor = Preprocessor.load(PREPROCESSOR_DIR) if Path(PREPROCESSOR_DIR).exists() else None
+
+    trained = train_streaming(data_path, preprocessor)
+    name, result = next(iter(trained['results'].items()))
+    print(f"{name}: {trained['rows']} обучающих строк за {result['fit_time']:.2f} s, "
+          f"отложено для оценки {len(result['y_true'])}")
+    print(f"память: чанк {trained['memory']['chunk'] / 2 ** 20:.1f} MB, "
+          f"резервуар {trained['memory']['reservoir'] / 2 ** 20:.1f} MB")
+    for point in trained['history']:
+        print(f"  после {point['rows']} строк: ROC-AUC {point['roc_auc']:.3f}")
+    print(report(result['evaluation'], "вовремя", "опоздал"))
+    print(compare_results(trained['results']).to_string(index=False, float_format='%.3f'))
+
+    # в реестр вместе со своим масштабом - serve.py применяет его поверх transform(scaled=False)
+    metrics = {key: result[key] for key in ('accuracy', 'precision', 'recall', 'f1', 'roc_auc')}
+    path = register(name, trained['model'], trained['preprocessor'], metrics, content_fingerprint(data_path),
+                    result['fit_time'], scaler=trained['scaler'])
+    print(f"{name} -> {path}")
@@ -0,0 +1,212 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# оценка бинарного классификатора за одну сортировку вероятностей:
+# накопленные суммы меток по убыванию вероятности дают матрицу ошибок при любом пороге,
+# отсюда - ROC и PR кривые, AUC, average precision, лучший по F1 порог и все метрики при пороге 0.5.
+# предсказание "1" при proba > порога (как predict у sklearn: при 0.5 ровно - класс 0).
+# бутстрэп: реплика - это веса строк (сколько раз строка попала в выборку), матрица индексов (batch, n)
+# сворачивается в веса одним bincount, и метрики всех реплик считаются матричными произведениями.
+# реплики общие для всех моделей (парный бутстрэп), пачки раздаются процессам как в lab_2 resampling
+DEFAULT_THRESHOLD = 0.5
+BOOTSTRAP_RESAMPLES = 2000
+BATCH_ELEMENTS = 4_000_000  # элементов матрицы весов на пачку
+BOOTSTRAP_METRICS = ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']
+
+
+def _divide(a, b, empty: float = 0.0):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    return np.divide(a, b, out=np.full(np.broadcast(a, b).shape, empty), where=b > 0)
+
+
+def _metrics(tp, fp, fn, tn) -> dict:
+    return {
+        'accuracy': _divide(tp + tn, tp + fp + fn + tn),
+        'precision': _divide(tp, tp + fp),
+        'recall': _divide(tp, tp + fn),
+        'f1': _divide(2 * tp, 2 * tp + fp + fn),
+    }
+
+
+def evaluate_thresholds(y_true, y_proba, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    y_true = np.asarray(y_true).astype(np.int64)
+    y_proba = np.asarray(y_proba, dtype=np.float64)
+    order = np.argsort(-y_proba, kind='stable')
+    proba, labels = y_proba[order], y_true[order]
+    # positives[i] - число единиц среди i строк с наибольшей вероятностью
+    positives = np.r_[0, np.cumsum(labels)]
+    n, n_pos = len(labels), int(positives[-1])
+    n_neg = n - n_pos
+
+    # пороги - различные значения вероятности; у группы равных вероятностей одна точка кривой
+    ends = np.r_[np.flatnonzero(proba[1:] != proba[:-1]), n - 1] + 1
+    tp = np.r_[0, positives[ends]]
+    fp = np.r_[0, ends] - tp
+    fn, tn = n_pos - tp, n_neg - fp
+    thresholds = np.r_[np.inf, proba[ends - 1]]
+
+    tpr, fpr = _divide(tp, n_pos), _divide(fp, n_neg)
+    precision = _divide(tp, tp + fp, empty=1.0)
+    f1 = _divide(2 * tp, 2 * tp + fp + fn)
+    best = int(f1.argmax())
+
+    # при пороге t в "1" попадают строки с proba > t: их число - позиция t в убывающем массиве
+    k = int(np.searchsorted(-proba, -threshold, side='left'))
+    tp_t = int(positives[k])
+    fp_t = k - tp_t
+    fn_t, tn_t = n_pos - tp_t, n_neg - fp_t
+    at_threshold = {key: float(value) for key, value in _metrics(tp_t, fp_t, fn_t, tn_t).items()}
+    at_threshold['confusion_matrix'] = np.array([[tn_t, fp_t], [fn_t, tp_t]])
+    # метрики класса 0 - те же формулы с переставленными ролями классов (для отчета по классам)
+    at_threshold['negative'] = {key: float(value) for key, value in _metrics(tn_t, fn_t, fp_t, tp_t).items()}
+
+    return {
+        'thresholds': thresholds,
+        'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn,
+        'tpr': tpr, 'fpr': fpr,
+        'precision': precision, 'recall': tpr, 'f1': f1,
+        'roc_auc': float(np.trapezoid(tpr, fpr)) if n_pos and n_neg else float('nan'),
+        'average_precision': float(np.sum(np.diff(tpr) * precision[1:])),
+        'best_f1': float(f1[best]),
+        # порог для правила proba >= best_threshold
+        'best_threshold': float(thresholds[best]),
+        'threshold': threshold,
+        'at_threshold': at_threshold,
+        'support': (n_neg, n_pos),
+    }
+
+
+def report(evaluation: dict, target_1: str, target_2: str) -> str:
+    # аналог classification_report из уже посчитанной матрицы ошибок
+    at = evaluation['at_threshold']
+    width = max(len(target_1), len(target_2), 12)
+    lines = [f"{'':>{width}} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}", '']
+    for name, metrics, support in [(target_1, at['negative'], evaluation['support'][0]),
+                                   (target_2, at, evaluation['support'][1])]:
+        lines.append(f"{name:>{width}} {metrics['precision']:9.2f} {metrics['recall']:9.2f} {metrics['f1']:9.2f} "
+                     f"{support:9d}")
+    lines += ['', f"{'accuracy':>{width}} {'':9} {'':9} {at['accuracy']:9.2f} {sum(evaluation['support']):9d}",
+              f"{'threshold':>{width}} {evaluation['threshold']:9.2f}"]
+    return '\n'.join(lines)
+
+
+_data = {}
+
+
+def _init_worker(y_true: np.ndarray, probas: list, threshold: float):
+    _data['y'] = y_true.astype(np.float64)
+    _data['models'] = []
+    for proba in probas:
+        # порядок по возрастанию вероятности и начала групп равных вероятностей - для AUC со связями
+        order = np.argsort(proba, kind='stable')
+        sorted_proba = proba[order]
+        starts = np.flatnonzero(np.r_[True, sorted_proba[1:] != sorted_proba[:-1]])
+        _data['models'].append({'predicted': (proba > threshold).astype(np.float64), 'order': order,
+                                'starts': starts})
+
+
+def weighted_metrics(weights: np.ndarray, y_true: np.ndarray, model: dict) -> dict:
+    # weights (batch, n) -> метрики (batch,); y_true float 0/1, model - как в _init_worker
+    predicted = model['predicted']
+    tp = weights @ (y_true * predicted)
+    fp = weights @ ((1 - y_true) * predicted)
+    positives, total = weights @ y_true, weights.sum(axis=1)
+    metrics = _metrics(tp, fp, positives - tp, total - positives - fp)
+
+    # AUC = P(proba случайной единицы > proba случайного нуля), связи - пополам; суммы весов по группам связей
+    sorted_weights = weights[:, model['order']]
+    group_pos = np.add.reduceat(sorted_weights * y_true[model['order']], model['starts'], axis=1)
+    group_neg = np.add.reduceat(sorted_weights, model['starts'], axis=1) - group_pos
+    below = np.cumsum(group_neg, axis=1) - group_neg
+    metrics['roc_auc'] = _divide((group_pos * (below + 0.5 * group_neg)).sum(axis=1),
+                                 positives * (total - positives), empty=np.nan)
+    return metrics
+
+
+def _bootstrap_batch(batch: int, seed: np.random.SeedSequence) -> dict:
+    rng = np.random.default_rng(seed)
+    n = len(_data['y'])
+    indices = rng.integers(0, n, (batch, n))
+    offsets = np.arange(batch)[:, None] * n
+    weights = np.bincount((indices + offsets).ravel(), minlength=batch * n).reshape(batch, n).astype(np.float64)
+    per_model = [weighted_metrics(weights, _data['y'], model) for model in _data['models']]
+    return {metric: np.stack([m[metric] for m in per_model], axis=1) for metric in BOOTSTRAP_METRICS}
+
+
+def bootstrap_metrics(y_true, probas: list, resamples: int = BOOTSTRAP_RESAMPLES, confidence: float = 0.95,
+                      workers: int = None, seed: int = 42, threshold: float = DEFAULT_THRESHOLD) -> dict:
+    # перцентильные интервалы метрик для нескольких моделей на одном тесте;
+    # replicates[metric] - (resamples, модели), реплики одинаковые для всех моделей
+    y_true = np.asarray(y_true).astype(np.int64)
+    probas = [np.asarray(p, dtype=np.float64) for p in probas]
+    n = len(y_true)
+    batch = max(1, min(resamples, BATCH_ELEMENTS // max(n, 1)))
+    batches = [batch] * (resamples // batch) + ([resamples % batch] if resamples % batch else [])
+    # свой seed у каждой пачки - результат не зависит от числа процессов
+    seeds = np.random.SeedSequence(seed).spawn(len(batches))
+
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+    if workers == 1:
+        _init_worker(y_true, probas, threshold)
+        parts = list(map(_bootstrap_batch, batches, seeds))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(y_true, probas, threshold)) as pool:
+            parts = list(pool.map(_bootstrap_batch, batches, seeds))
+
+    replicates = {metric: np.concatenate([p[metric] for p in parts]) for metric in BOOTSTRAP_METRICS}
+    tail = (1 - confidence) / 2
+    return {
+        'replicates': replicates,
+        'low': {metric: np.nanquantile(r, tail, axis=0) for metric, r in replicates.items()},
+        'high': {metric: np.nanquantile(r, 1 - tail, axis=0) for metric, r in replicates.items()},
+        'confidence': confidence,
+    }
+
+
+if __name__ == "__main__":
+    # сверка с sklearn на данных со связями вероятностей
+    from sklearn.metrics import accuracy_score, average_precision_score, confusion_matrix, f1_score, \
+        precision_score, recall_score, roc_auc_score
+
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 20_000)
+    proba = np.round(np.clip(0.3 * y + rng.normal(0.35, 0.2, len(y)), 0, 1), 2)
+    evaluation = evaluate_thresholds(y, proba)
+    at = evaluation['at_threshold']
+    y_pred = (proba > 0.5).astype(int)
+
+    assert np.isclose(evaluation['roc_auc'], roc_auc_score(y, proba))
+    assert np.isclose(evaluation['average_precision'], average_precision_score(y, proba))
+    assert np.isclose(at['accuracy'], accuracy_score(y, y_pred))
+    assert np.isclose(at['precision'], precision_score(y, y_pred))
+    assert np.isclose(at['recall'], recall_score(y, y_pred))
+    assert np.isclose(at['f1'], f1_score(y, y_pred))
+    assert np.array_equal(at['confusion_matrix'], confusion_matrix(y, y_pred))
+
+    best = max(f1_score(y, (proba >= t).astype(int)) for t in np.unique(proba))
+    assert np.isclose(evaluation['best_f1'], best)
+    assert np.isclose(f1_score(y, (proba >= evaluation['best_threshold']).astype(int)), best)
+    print(f"ROC-AUC {evaluation['roc_auc']:.4f}, AP {evaluation['average_precision']:.4f}, "
+          f"best F1 {evaluation['best_f1']:.4f} при пороге {evaluation['best_threshold']:.2f}")
+    print(report(evaluation, 'нет', 'да'))
+
+    # взвешенные метрики бутстрэпа совпадают с sklearn с sample_weight
+    import time
+
+    weights = rng.integers(0, 4, (3, len(y))).astype(np.float64)
+    _init_worker(y, [proba], DEFAULT_THRESHOLD)
+    weighted = weighted_metrics(weights, y.astype(np.float64), _data['models'][0])
+    for row, w in enumerate(weights):
+        assert np.isclose(weighted['roc_auc'][row], roc_auc_score(y, proba, sample_weight=w))
+        assert np.isclose(weighted['f1'][row], f1_score(y, y_pred, sample_weight=w))
+        assert np.isclose(weighted['accuracy'][row], accuracy_score(y, y_pred, sample_weight=w))
+
+    y_test = y[:4000]
+    start = time.perf_counter()
+    boot = bootstrap_metrics(y_test, [proba[:4000], np.clip(proba[:4000] + rng.normal(0, 0.1, 4000), 0, 1)],
+                             resamples=2000)
+    print(f"бутстрэп 2000 реплик x 2 модели по {len(y_test)} строкам: {time.perf_counter() - start:.2f} s")
+    print({metric: (np.round(boot['low'][metric], 3), np.round(boot['high'][metric], 3))
+           for metric in BOOTSTRAP_METRICS})
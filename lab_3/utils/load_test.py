@@ -0,0 +1,73 @@
+import http.client
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from lab_3.utils.preprocessor import Preprocessor
+
+# генератор нагрузки для serve.py: THREADS клиентов с keep-alive соединениями шлют по одной аренде
+# (случайные строки датасета) в течение SECONDS секунд; клиентские p50/p99 сравниваются с /metrics сервиса.
+# запуск из lab_3/utils: python load_test.py [url] [потоки] [секунды]
+URL = "http://127.0.0.1:8000"
+THREADS = 16
+SECONDS = 10.0
+SAMPLE_ROWS = 1000
+
+
+def client(url: str, rows: list, deadline: float, seed: int, latencies: list):
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    rng = np.random.default_rng(seed)
+    local = []
+    while time.perf_counter() < deadline:
+        body = rows[rng.integers(len(rows))]
+        start = time.perf_counter()
+        connection.request('POST', '/score', body=body, headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        if response.status == 200:
+            local.append(time.perf_counter() - start)
+    connection.close()
+    latencies.extend(local)
+
+
+def fetch_metrics(url: str) -> dict:
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+    connection.request('GET', '/metrics')
+    return json.loads(connection.getresponse().read())
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else URL
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else THREADS
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else SECONDS
+
+    columns = Preprocessor().input_columns
+    sample = pd.read_parquet("../data/optimized_sakila_pg.parquet", columns=columns).sample(SAMPLE_ROWS,
+                                                                                            random_state=0)
+    # тела запросов готовятся заранее, чтобы клиент мерил сервис, а не сериализацию
+    rows = [json.dumps(row).encode() for row in json.loads(sample.to_json(orient='records'))]
+
+    before = fetch_metrics(url)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    workers = [threading.Thread(target=client, args=(url, rows, deadline, seed, latencies)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    after = fetch_metrics(url)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(f"клиент: {len(latencies)} запросов за {seconds:.0f} s в {threads} потоков -> "
+          f"{len(latencies) / seconds:.0f} rps, p50 {p50:.1f} ms, p99 {p99:.1f} ms")
+    batches = after['batches'] - before['batches']
+    print(f"сервис: p50 {after['p50_ms']:.1f} ms, p99 {after['p99_ms']:.1f} ms, "
+          f"{after['recent_rps']:.0f} rps, пачек {batches}, "
+          f"средняя пачка {(after['rows'] - before['rows']) / max(batches, 1):.1f}, ошибок {after['errors']}")
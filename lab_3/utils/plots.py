@@ -31,4 +31,17 @@ def correlation_matrix_plot(df: pd.DataFrame, is_sakila: bool = False):
     sns.heatmap(corr_matrix, annot=True, fmt='.2f', cmap='coolwarm', center=0)
     plt.title('Корреляция признаков')
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    plt.show()
+
+def confusion_matrices_plot(results: dict, target_1: str, target_2: str):
+    # матрицы ошибок всех моделей рядом на одной фигуре
+    fig, axes = plt.subplots(1, len(results), figsize=(4 * len(results), 3.5), squeeze=False)
+    for ax, (name, result) in zip(axes[0], results.items()):
+        sns.heatmap(result['confusion_matrix'], annot=True, fmt='d', cmap='Blues', ax=ax,
+                    xticklabels=[target_1, target_2],
+                    yticklabels=[target_1, target_2])
+        ax.set_title(f'Confusion Matrix: {name}')
+        ax.set_ylabel('Истинный класс')
+        ax.set_xlabel('Предсказанный класс')
+    plt.tight_layout()
+    plt.show()
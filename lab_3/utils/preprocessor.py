@@ -0,0 +1,259 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.utils.sparsefuncs import mean_variance_axis
+
+from lab_2.utils.encoding import HASH_BUCKETS, OTHER, RATING_ORDER, TOP_COUNTRIES, _as_categorical, \
+    _one_hot_columns, codes_csr, frequency_table, group_folds, group_rare, hashed_csr, lookup, ordinal_codes, \
+    target_encode_oof, target_fold_tables, target_table
+
+# обучаемая предобработка lab_3: словари категорий, top стран, заполнение пропусков и масштаб
+# запоминаются один раз на обучающих строках, дальше любой батч кодируется в тот же набор столбцов
+# (незнакомая категория - пустая строка one-hot, незнакомая страна - Other).
+# столбцы с сотнями-тысячами значений кодируются в фиксированную ширину: hashing trick, частота, target (OOF).
+# при обучении с groups (rental_id) запоминаются и out-of-fold таблицы target по фолдам-хэшам группы:
+# transform(groups=...) дает обучающим строкам те же OOF-значения, что и fit_transform (потоковое дообучение).
+# split - метка разбиения, на обучающей части которого обучены таблицы (сверяется в train_streaming).
+# на диске: preprocessor.json (раскладка + schema_hash + ключи таблиц) и preprocessor.npz (числовые массивы)
+FORMAT_VERSION = 3
+
+# rental_duration_days сюда не входит: это срок уже состоявшейся аренды, из него и считается late_return
+NUMERIC = ['rental_duration', 'length', 'rental_rate', 'replacement_cost', 'amount']
+HASHED = ['city', 'postal_code']
+FREQUENCY = ['customer_id', 'actor_id', 'title']
+TARGET = ['customer_id', 'actor_id', 'title']
+
+
+class Preprocessor:
+    def __init__(self, numeric: list = None, top_countries: int = TOP_COUNTRIES, hashed: list = None,
+                 buckets: int = HASH_BUCKETS, frequency: list = None, target: list = None):
+        # None - набор по умолчанию, [] - без этих кодировщиков
+        self.numeric = list(NUMERIC if numeric is None else numeric)
+        self.top_countries = top_countries
+        self.hashed = list(HASHED if hashed is None else hashed)
+        self.buckets = buckets
+        self.frequency = list(FREQUENCY if frequency is None else frequency)
+        self.target = list(TARGET if target is None else target)
+        self.categories = None
+        self.countries = None
+        self.fill = None
+        self.scale = None
+        self.frequency_tables = {}
+        self.target_tables = {}
+        self.target_prior = None
+        self.target_folds = {}
+        self.split = None
+
+    @property
+    def input_columns(self) -> list:
+        # столбцы сырых данных, которые читает transform (например, поля запроса к serve.py)
+        return list(dict.fromkeys(self.numeric + ['rating', 'category', 'country']
+                                  + self.hashed + self.frequency + self.target))
+
+    @property
+    def feature_names(self) -> list:
+        return (self.numeric + ['rating_encoded']
+                + [f'category_{v.replace(" ", "_")}' for v in self.categories]
+                + [f'country_{v.replace(" ", "_")}' for v in self.countries]
+                + [f'{column}_hash{i}' for column in self.hashed for i in range(self.buckets)]
+                + [f'{column}_freq' for column in self.frequency]
+                + [f'{column}_target' for column in self.target])
+
+    def _layout(self) -> dict:
+        return {'format': FORMAT_VERSION, 'numeric': self.numeric, 'rating': RATING_ORDER,
+                'categories': self.categories, 'countries': self.countries, 'hashed': self.hashed,
+                'buckets': self.buckets, 'frequency': self.frequency, 'target': self.target,
+                'features': self.feature_names}
+
+    @property
+    def schema_hash(self) -> str:
+        # хэш раскладки столбцов: модель, обученная на одной раскладке, не примет матрицу другой
+        return hashlib.sha1(json.dumps(self._layout(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def _fit(self, df: pd.DataFrame, y, groups=None, split: str = None) -> sparse.csr_matrix:
+        # запоминает словари и таблицы, возвращает немасштабированную матрицу обучающих строк;
+        # groups - ключ повторяющихся строк (rental_id) для фолдов out-of-fold target
+        if self.target and y is None:
+            raise ValueError("Для target-кодирования нужен y")
+        self.split = split
+        self.fill = df[self.numeric].mean().to_numpy(dtype=np.float64)
+        values = _as_categorical(df['category'])
+        order, _ = _one_hot_columns(values, 'category')
+        self.categories = [str(values.categories[i]) for i in order]
+        self.countries = list(group_rare(df['country'], self.top_countries).categories)
+        self.frequency_tables = {column: frequency_table(df[column]) for column in self.frequency}
+        self.target_tables = {column: target_table(df[column], y)[0] for column in self.target}
+        self.target_prior = float(np.mean(y)) if self.target else None
+
+        # обучающие строки получают out-of-fold target, иначе модель увидит собственный таргет
+        if groups is None:
+            self.target_folds = {}
+            oof = {column: target_encode_oof(df[column], y) for column in self.target}
+        else:
+            fold = group_folds(groups)
+            self.target_folds = {column: target_fold_tables(df[column], y, fold) for column in self.target}
+            oof = self._target_oof(df, fold)
+        x = self._matrix(df, oof)
+        # масштаб как у StandardScaler(with_mean=False): без центрирования нули one-hot остаются нулями
+        _, variance = mean_variance_axis(x, axis=0)
+        scale = np.sqrt(variance)
+        self.scale = np.where(scale > 0, scale, 1.0)
+        return x
+
+    def _target_oof(self, df: pd.DataFrame, fold: np.ndarray) -> dict:
+        # код -1 (пропуск или незнакомое значение) попадает в последний столбец - prior фолда
+        values = {}
+        for column in self.target:
+            codes = pd.Categorical(df[column], categories=self.target_tables[column].index).codes
+            values[column] = self.target_folds[column][fold, codes]
+        return values
+
+    def _matrix(self, df: pd.DataFrame, target_values: dict = None) -> sparse.csr_matrix:
+        numeric = df[self.numeric].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        rows, cols = np.nonzero(np.isnan(numeric))
+        numeric[rows, cols] = self.fill[cols]
+        rating = ordinal_codes(df['rating'], RATING_ORDER).astype(np.float64)
+
+        category = pd.Categorical(df['category'], categories=self.categories).codes
+        country = pd.Categorical(df['country'], categories=self.countries).codes
+        # страны вне запомненного top (и пропуски) -> Other
+        country = np.where(country >= 0, country, self.countries.index(OTHER))
+
+        # незнакомые значения: частота 0, target - общее среднее
+        frequency = [lookup(df[column], self.frequency_tables[column]) for column in self.frequency]
+        target = [target_values[column] if target_values else
+                  lookup(df[column], self.target_tables[column], self.target_prior) for column in self.target]
+
+        return sparse.hstack([
+            sparse.csr_matrix(np.column_stack([numeric, rating])),
+            codes_csr(category, len(self.categories)),
+            codes_csr(country, len(self.countries)),
+            *[hashed_csr(df[column], column, self.buckets)[0] for column in self.hashed],
+            sparse.csr_matrix(np.column_stack(frequency + target)) if frequency + target else None,
+        ], format='csr', dtype=np.float64)
+
+    def _scaled(self, x: sparse.csr_matrix) -> sparse.csr_matrix:
+        x.data /= self.scale[x.indices]
+        return x
+
+    def fit(self, df: pd.DataFrame, y=None, groups=None, split: str = None) -> 'Preprocessor':
+        self._fit(df, y, groups, split)
+        return self
+
+    def transform(self, df: pd.DataFrame, scaled: bool = True, groups=None) -> sparse.csr_matrix:
+        # scaled=False - без своего масштаба (например, когда масштаб дообучается по потоку через partial_fit);
+        # groups - строки обучающей части: target-столбцы out-of-fold по фолду группы, а не по полным таблицам
+        if self.scale is None:
+            raise RuntimeError("Preprocessor не обучен: сначала fit или load")
+        target_values = None
+        if groups is not None and self.target:
+            if not self.target_folds:
+                raise ValueError("Preprocessor обучен без groups: out-of-fold таблиц target нет")
+            target_values = self._target_oof(df, group_folds(groups))
+        x = self._matrix(df, target_values)
+        return self._scaled(x) if scaled else x
+
+    def fit_transform(self, df: pd.DataFrame, y=None, groups=None, split: str = None) -> sparse.csr_matrix:
+        # для обучающих строк target-столбцы out-of-fold (в отличие от fit(df, y).transform(df))
+        return self._scaled(self._fit(df, y, groups, split))
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        tables = {'frequency': {c: t.index.tolist() for c, t in self.frequency_tables.items()},
+                  'target': {c: t.index.tolist() for c, t in self.target_tables.items()}}
+        meta = self._layout() | {'top_countries': self.top_countries, 'target_prior': self.target_prior,
+                                 'tables': tables, 'target_folds': list(self.target_folds), 'split': self.split,
+                                 'schema_hash': self.schema_hash}
+        (path / 'preprocessor.json').write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+        arrays = {f'{kind}_{c}': t.to_numpy() for kind, group in [('frequency', self.frequency_tables),
+                                                                  ('target', self.target_tables)]
+                  for c, t in group.items()}
+        arrays |= {f'target_folds_{c}': folds for c, folds in self.target_folds.items()}
+        np.savez(path / 'preprocessor.npz', fill=self.fill, scale=self.scale, **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path, schema_hash: str = None) -> 'Preprocessor':
+        # schema_hash - ожидаемая раскладка (например, сохраненная рядом с моделью)
+        path = Path(path)
+        meta = json.loads((path / 'preprocessor.json').read_text(encoding='utf-8'))
+        if meta['format'] != FORMAT_VERSION:
+            raise ValueError(f"Неизвестная версия формата предобработки: {meta['format']}")
+
+        preprocessor = cls(meta['numeric'], meta['top_countries'], meta['hashed'], meta['buckets'],
+                           meta['frequency'], meta['target'])
+        preprocessor.categories = meta['categories']
+        preprocessor.countries = meta['countries']
+        preprocessor.target_prior = meta['target_prior']
+        preprocessor.split = meta['split']
+        if preprocessor.schema_hash != meta['schema_hash']:
+            raise ValueError(f"{path}: раскладка столбцов не совпадает с сохраненным schema_hash")
+        if schema_hash is not None and schema_hash != meta['schema_hash']:
+            raise ValueError(f"{path}: schema_hash {meta['schema_hash']}, а ожидался {schema_hash}")
+
+        with np.load(path / 'preprocessor.npz') as arrays:
+            preprocessor.fill, preprocessor.scale = arrays['fill'], arrays['scale']
+            for kind, group in [('frequency', preprocessor.frequency_tables), ('target', preprocessor.target_tables)]:
+                for column, keys in meta['tables'][kind].items():
+                    values = arrays[f'{kind}_{column}']
+                    if len(values) != len(keys):
+                        raise ValueError(f"{path}: таблица {kind} {column} повреждена")
+                    group[column] = pd.Series(values, index=pd.Index(keys))
+            for column in meta['target_folds']:
+                folds = arrays[f'target_folds_{column}']
+                if folds.shape[1] != len(preprocessor.target_tables[column]) + 1:
+                    raise ValueError(f"{path}: out-of-fold таблица {column} повреждена")
+                preprocessor.target_folds[column] = folds
+        if len(preprocessor.fill) != len(preprocessor.numeric) or \
+                len(preprocessor.scale) != len(preprocessor.feature_names):
+            raise ValueError(f"{path}: размеры массивов не совпадают с раскладкой")
+        return preprocessor
+
+
+if __name__ == "__main__":
+    # fit на обучающих строках -> save -> load -> transform нового батча; раскладка та же,
+    # хотя в батче свой top стран и свои города/клиенты, а результат совпадает с обученным объектом
+    import tempfile
+    import time
+
+    from sklearn.preprocessing import StandardScaler
+
+    from lab_2.utils.encoding import encode_sparse, model_matrix
+
+    columns = NUMERIC + ['rating', 'category', 'country'] + sorted(set(HASHED + FREQUENCY + TARGET))
+    df = pd.read_parquet("../data/optimized_sakila_pg.parquet", columns=columns + ['rental_date', 'return_date'])
+    y = ((df['return_date'] - df['rental_date']).dt.total_seconds() / 86400 > df['rental_duration']).astype(np.int8)
+    train, batch = df.iloc[:15_000], df.iloc[15_000:].sample(frac=1, random_state=0)
+
+    # без кодировщиков больших словарей - те же значения, что у encode_sparse + StandardScaler(with_mean=False)
+    plain = Preprocessor(hashed=[], frequency=[], target=[]).fit(train)
+    encoded, one_hot, _ = encode_sparse(train.copy())
+    reference = StandardScaler(with_mean=False).fit_transform(model_matrix(encoded[NUMERIC + ['rating_encoded']],
+                                                                           one_hot))
+    assert np.allclose(plain.transform(train).toarray(), reference.toarray())
+
+    fitted = Preprocessor()
+    x_train = fitted.fit_transform(train, y.iloc[:15_000])
+    # ширина задается настройками, а не числом городов/клиентов/фильмов
+    cardinality = {column: train[column].nunique() for column in sorted(set(HASHED + FREQUENCY + TARGET))}
+    print(f"значений: {cardinality} -> столбцов: {x_train.shape[1]}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fitted.save(tmp)
+        start = time.perf_counter()
+        loaded = Preprocessor.load(tmp, schema_hash=fitted.schema_hash)
+        load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    x = loaded.transform(batch)
+    transform_time = time.perf_counter() - start
+    assert x.shape[1] == len(fitted.feature_names)
+    assert (x != fitted.transform(batch)).nnz == 0
+
+    print(f"schema_hash: {loaded.schema_hash}, столбцов: {x.shape[1]}")
+    print(f"load: {load_time * 1000:.2f} ms, transform {x.shape[0]} строк: {transform_time * 1000:.2f} ms")
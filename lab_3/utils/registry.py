@@ -0,0 +1,141 @@
+import json
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from lab_3.utils.preprocessor import Preprocessor
+
+# реестр обученных моделей: registry/<имя>/v<N>/ - model.joblib, [scaler.joblib], preprocessor/, meta.json.
+# joblib пишется без сжатия, поэтому массивы numpy внутри модели (у KNN - вся обучающая матрица, у CSR -
+# data/indices/indptr) загружаются через mmap_mode='r': холодная загрузка - это отображение файла, а не чтение,
+# и несколько процессов скоринга делят одну физическую копию через page cache.
+# meta.json: метрики, fingerprint данных, раскладка признаков (schema_hash + имена), время обучения
+REGISTRY_DIR = "artifacts/registry"
+
+
+def slugify(name: str) -> str:
+    # "KNN (k=7, uniform)" -> knn_k_7_uniform
+    return re.sub(r'[^a-z0-9.]+', '_', name.lower()).strip('_')
+
+
+def _json_safe(value):
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+
+def _versions(model_dir: Path) -> list:
+    return sorted(int(p.name[1:]) for p in model_dir.glob('v*') if p.name[1:].isdigit())
+
+
+def register(name: str, model, preprocessor: Preprocessor, metrics: dict = None, fingerprint: str = None,
+             train_time: float = None, scaler=None, registry_dir=REGISTRY_DIR) -> Path:
+    # scaler - отдельный масштаб поверх preprocessor.transform(scaled=False) (потоковое обучение)
+    model_dir = Path(registry_dir) / slugify(name)
+    versions = _versions(model_dir)
+    path = model_dir / f'v{versions[-1] + 1 if versions else 1}'
+    path.mkdir(parents=True)
+
+    start = time.perf_counter()
+    joblib.dump(model, path / 'model.joblib')
+    if scaler is not None:
+        joblib.dump(scaler, path / 'scaler.joblib')
+    preprocessor.save(path / 'preprocessor')
+    meta = {
+        'name': name,
+        'version': int(path.name[1:]),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'model_class': type(model).__name__,
+        'params': _json_safe(model.get_params()),
+        'metrics': _json_safe(metrics or {}),
+        'data_fingerprint': fingerprint,
+        'schema_hash': preprocessor.schema_hash,
+        'features': preprocessor.feature_names,
+        'input_columns': preprocessor.input_columns,
+        'train_time_s': train_time,
+        'scaler': scaler is not None,
+        'size_bytes': sum(f.stat().st_size for f in path.rglob('*') if f.is_file()),
+        'save_time_s': time.perf_counter() - start,
+    }
+    (path / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def load(name: str, version: int = None, mmap: bool = True, registry_dir=REGISTRY_DIR) -> dict:
+    # version=None - последняя версия; mmap=False - обычная загрузка в память процесса
+    model_dir = Path(registry_dir) / slugify(name)
+    versions = _versions(model_dir)
+    if not versions:
+        raise FileNotFoundError(f"В реестре {registry_dir} нет модели {name}")
+    path = model_dir / f'v{version or versions[-1]}'
+    meta = json.loads((path / 'meta.json').read_text(encoding='utf-8'))
+
+    mmap_mode = 'r' if mmap else None
+    return {
+        'model': joblib.load(path / 'model.joblib', mmap_mode=mmap_mode),
+        'scaler': joblib.load(path / 'scaler.joblib', mmap_mode=mmap_mode) if meta['scaler'] else None,
+        # раскладка предобработки должна совпадать с той, на которой обучалась модель
+        'preprocessor': Preprocessor.load(path / 'preprocessor', schema_hash=meta['schema_hash']),
+        'meta': meta,
+        'path': path,
+    }
+
+
+def list_models(registry_dir=REGISTRY_DIR) -> pd.DataFrame:
+    rows = []
+    for meta_path in sorted(Path(registry_dir).glob('*/v*/meta.json')):
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        rows.append({'model': meta_path.parent.parent.name, 'version': meta['version'], 'class': meta['model_class'],
+                     'created': meta['created'], 'roc_auc': meta['metrics'].get('roc_auc'),
+                     'f1': meta['metrics'].get('f1'), 'size_mb': meta['size_bytes'] / 2 ** 20,
+                     'data': meta['data_fingerprint'], 'schema': meta['schema_hash']})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # холодная загрузка с mmap против обычной и против повторного обучения; запуск из lab_3/utils
+    # после task_2.py (реестр - ../artifacts/registry)
+    registry_dir = Path('..') / REGISTRY_DIR
+    table = list_models(registry_dir)
+    print(table.to_string(index=False, float_format='%.3f'))
+
+    def mapped_bytes(value, seen: set) -> int:
+        # объем массивов модели (в т.ч. внутри CSR и деревьев), которые отображены с диска, а не скопированы
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        if isinstance(value, np.memmap) or (isinstance(value, np.ndarray) and isinstance(value.base, np.memmap)):
+            return value.nbytes
+        if isinstance(value, dict):
+            return sum(mapped_bytes(v, seen) for v in value.values())
+        if isinstance(value, (list, tuple)):
+            return sum(mapped_bytes(v, seen) for v in value)
+        if hasattr(value, '__dict__') and not isinstance(value, type):
+            return mapped_bytes(vars(value), seen)
+        return 0
+
+    sample = pd.read_parquet("../data/optimized_sakila_pg.parquet").head(1000)
+    for name in table['model'].unique():
+        load(name, registry_dir=registry_dir)  # прогрев импортов, чтобы мерить только загрузку
+        for mmap in (True, False):
+            start = time.perf_counter()
+            loaded = load(name, mmap=mmap, registry_dir=registry_dir)
+            elapsed = time.perf_counter() - start
+            x = loaded['preprocessor'].transform(sample, scaled=loaded['scaler'] is None)
+            if loaded['scaler'] is not None:
+                x = loaded['scaler'].transform(x)
+            proba = loaded['model'].predict_proba(x)[:, 1]
+            print(f"{name} ({'mmap' if mmap else 'в память'}): {elapsed * 1000:.1f} ms, "
+                  f"отображено с диска {mapped_bytes(loaded['model'], set()) / 2 ** 10:.0f} KB, "
+                  f"обучение: {loaded['meta']['train_time_s']:.3f} s, средняя proba {proba.mean():.3f}")
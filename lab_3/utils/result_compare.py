@@ -1,14 +1,42 @@
+import numpy as np
 import pandas as pd
 
+from lab_3.utils.evaluation import BOOTSTRAP_RESAMPLES, bootstrap_metrics
 
-def compare_results(results: dict) -> pd.DataFrame:
-    comparison_df = pd.DataFrame({
-        'Модель': list(results.keys()),
-        'Accuracy': [f"{v['accuracy']:.3f}" for v in results.values()],
-        'Precision': [f"{v['precision']:.3f}" for v in results.values()],
-        'Recall': [f"{v['recall']:.3f}" for v in results.values()],
-        'F1-score': [f"{v['f1']:.3f}" for v in results.values()],
-        'ROC-AUC': [f"{v['roc_auc']:.3f}" for v in results.values()]
-    })
+METRIC_TITLES = {
+    'accuracy': 'Accuracy',
+    'precision': 'Precision',
+    'recall': 'Recall',
+    'f1': 'F1-score',
+    'roc_auc': 'ROC-AUC',
+}
 
-    return comparison_df
\ No newline at end of file
+
+def compare_results(results: dict, resamples: int = BOOTSTRAP_RESAMPLES, confidence: float = 0.95,
+                    workers: int = None, seed: int = 42) -> pd.DataFrame:
+    # точечные значения - из evaluation (evaluate_thresholds), рядом - бутстрэп-интервал (low, high).
+    # реплики общие для всех моделей, поэтому интервал разницы ROC-AUC с первой моделью - парный:
+    # если он накрывает 0, разница между моделями на этом тесте - шум. все столбцы числовые
+    names = list(results)
+    evaluations = [results[name]['evaluation'] for name in names]
+    boot = bootstrap_metrics(results[names[0]]['y_true'], [results[name]['y_proba'] for name in names],
+                             resamples=resamples, confidence=confidence, workers=workers, seed=seed)
+
+    columns = {'Модель': names}
+    for metric, title in METRIC_TITLES.items():
+        point = [e['roc_auc'] if metric == 'roc_auc' else e['at_threshold'][metric] for e in evaluations]
+        columns[title] = point
+        columns[f'{title} low'] = boot['low'][metric]
+        columns[f'{title} high'] = boot['high'][metric]
+
+    auc = boot['replicates']['roc_auc']
+    difference = auc - auc[:, :1]
+    tail = (1 - confidence) / 2
+    columns['ΔROC-AUC'] = np.array(columns['ROC-AUC']) - columns['ROC-AUC'][0]
+    columns['ΔROC-AUC low'] = np.nanquantile(difference, tail, axis=0)
+    columns['ΔROC-AUC high'] = np.nanquantile(difference, 1 - tail, axis=0)
+
+    columns['PR-AUC'] = [e['average_precision'] for e in evaluations]
+    columns['Best F1'] = [e['best_f1'] for e in evaluations]
+    columns['Порог'] = [e['best_threshold'] for e in evaluations]
+    return pd.DataFrame(columns)
@@ -0,0 +1,77 @@
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from lab_2.utils.encoding import encode, encode_sparse, model_matrix
+from lab_2.utils.new_features import add_features
+
+# сравнение плотного и разреженного (CSR one-hot) путей lab_3: память матрицы признаков в том виде,
+# в каком ее видят модели (float64), и время масштабирования / обучения / предсказания
+
+
+def matrix_bytes(x) -> int:
+    if sparse.issparse(x):
+        return x.data.nbytes + x.indices.nbytes + x.indptr.nbytes
+    return x.nbytes
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def run(x: np.ndarray, y: np.ndarray, train_idx: np.ndarray, test_idx: np.ndarray, scaler) -> dict:
+    result = {'bytes': matrix_bytes(x)}
+    (x_train, x_test), result['scale'] = timed(lambda: (scaler.fit_transform(x[train_idx]),
+                                                        scaler.transform(x[test_idx])))
+    lr = LogisticRegression(max_iter=1000, random_state=42)
+    _, result['lr_fit'] = timed(lambda: lr.fit(x_train, y[train_idx]))
+    knn = KNeighborsClassifier(n_neighbors=5)
+    _, result['knn_fit'] = timed(lambda: knn.fit(x_train, y[train_idx]))
+    result['knn_pred'], result['knn_predict'] = timed(lambda: knn.predict(x_test))
+    result['lr_proba'] = lr.predict_proba(x_test)[:, 1]
+    return result
+
+
+if __name__ == "__main__":
+    columns = [
+        'rental_date', 'return_date', 'rental_duration', 'length', 'rental_rate',
+        'replacement_cost', 'amount', 'rating', 'category', 'country'
+    ]
+    df = pd.read_parquet("../data/optimized_sakila_pg.parquet", columns=columns)
+    df = add_features(df, ['rental_duration_days', 'late_return'])
+    df = df[df['return_date'].notna()]
+
+    dense_df = encode(df.copy())
+    sparse_df, one_hot, _ = encode_sparse(df.copy())
+    y = dense_df['late_return'].to_numpy()
+
+    dense_cols = dense_df.drop('late_return', axis=1).select_dtypes(include=['number']).columns
+    sparse_cols = sparse_df.drop('late_return', axis=1).select_dtypes(include=['number']).columns
+    # порядок столбцов один и тот же: числовые, rating_encoded, затем one-hot
+    x_dense = dense_df[dense_cols].to_numpy(dtype=np.float64)
+    x_sparse = model_matrix(sparse_df[sparse_cols], one_hot)
+    assert np.array_equal(x_sparse.toarray(), x_dense), "матрицы признаков различаются"
+
+    order = np.random.default_rng(42).permutation(len(y))
+    train_idx, test_idx = order[:int(len(y) * 0.8)], order[int(len(y) * 0.8):]
+
+    dense = run(x_dense, y, train_idx, test_idx, StandardScaler())
+    sparse_result = run(x_sparse, y, train_idx, test_idx, StandardScaler(with_mean=False))
+
+    # центрирование не меняет расстояний KNN, а у логрегрессии уходит в intercept (с точностью до регуляризации)
+    knn_same = (dense['knn_pred'] == sparse_result['knn_pred']).mean()
+    lr_diff = np.abs(dense['lr_proba'] - sparse_result['lr_proba']).max()
+
+    print(f"data: {x_dense.shape}, ненулевых: {x_sparse.nnz / np.prod(x_dense.shape):.1%}")
+    print(f"{'':14}{'dense':>10}{'sparse':>10}")
+    print(f"{'память, MB':14}{dense['bytes'] / 2 ** 20:10.2f}{sparse_result['bytes'] / 2 ** 20:10.2f}")
+    for key in ['scale', 'lr_fit', 'knn_fit', 'knn_predict']:
+        print(f"{key + ', s':14}{dense[key]:10.3f}{sparse_result[key]:10.3f}")
+    print(f"совпадение предсказаний KNN: {knn_same:.2%}, макс. разница вероятностей LR: {lr_diff:.2e}")
@@ -0,0 +1,132 @@
+import time
+from functools import partial
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from sklearn.neighbors import KNeighborsClassifier, NearestNeighbors
+
+# перебор гиперпараметров без повторных обучений:
+# KNN - граф соседей строится один раз для наибольшего k, а вероятности для всех меньших k и обоих weights
+# считаются кумулятивными суммами меток соседей; логрегрессия - путь по C от сильной регуляризации
+# к слабой с warm_start, каждое обучение стартует с решения предыдущего.
+# задача бинарная (как late_return): метки 0/1
+KNN_KS = [1, 3, 5, 7, 9, 11, 15, 21, 31]
+KNN_WEIGHTS = ['uniform', 'distance']
+LR_CS = np.logspace(-3, 2, 11)
+# до этой размерности KD-дерево, выше - ball tree; разреженным матрицам деревья не подходят - brute
+KD_TREE_MAX_DIM = 15
+
+
+def _algorithm(x) -> str:
+    if sparse.issparse(x):
+        return 'brute'
+    return 'kd_tree' if x.shape[1] <= KD_TREE_MAX_DIM else 'ball_tree'
+
+
+def _scores(y_valid: np.ndarray, proba: np.ndarray) -> dict:
+    # predict у sklearn - argmax по классам, при равенстве класс 0: то есть proba > 0.5
+    y_pred = (proba > 0.5).astype(int)
+    return {'roc_auc': roc_auc_score(y_valid, proba), 'f1': f1_score(y_valid, y_pred),
+            'accuracy': accuracy_score(y_valid, y_pred)}
+
+
+def knn_probabilities(distances: np.ndarray, labels: np.ndarray, ks: list) -> dict:
+    # distances/labels - (n, max_k) по возрастанию расстояния; {(k, weights): P(класс 1)}
+    result = {}
+    uniform = np.cumsum(labels, axis=1)
+    # distance: веса 1/d; если среди k соседей есть точные совпадения (d=0), голосуют только они, как в sklearn
+    zero = distances == 0
+    zero_count, zero_positive = np.cumsum(zero, axis=1), np.cumsum(zero * labels, axis=1)
+    weights = np.divide(1.0, distances, out=np.zeros_like(distances), where=~zero)
+    weight_sum, weight_positive = np.cumsum(weights, axis=1), np.cumsum(weights * labels, axis=1)
+    for k in ks:
+        result[(k, 'uniform')] = uniform[:, k - 1] / k
+        exact = zero_count[:, k - 1] > 0
+        result[(k, 'distance')] = np.where(
+            exact,
+            zero_positive[:, k - 1] / np.maximum(zero_count[:, k - 1], 1),
+            weight_positive[:, k - 1] / np.where(exact, 1.0, weight_sum[:, k - 1]),
+        )
+    return result
+
+
+def knn_sweep(x_train, y_train, x_valid, y_valid, ks: list = None, weights: list = None) -> pd.DataFrame:
+    ks = sorted(ks or KNN_KS)
+    weights = weights or KNN_WEIGHTS
+    y_train, y_valid = np.asarray(y_train), np.asarray(y_valid)
+
+    start = time.perf_counter()
+    algorithm = _algorithm(x_train)
+    index = NearestNeighbors(n_neighbors=ks[-1], algorithm=algorithm).fit(x_train)
+    distances, neighbors = index.kneighbors(x_valid)
+    probabilities = knn_probabilities(distances, y_train[neighbors].astype(np.float64), ks)
+    elapsed = time.perf_counter() - start
+
+    rows = [{'model': 'KNN', 'k': k, 'weights': w, **_scores(y_valid, probabilities[(k, w)])}
+            for k in ks for w in weights]
+    table = pd.DataFrame(rows)
+    table.attrs['time'] = elapsed
+    table.attrs['algorithm'] = algorithm
+    return table
+
+
+def lr_sweep(x_train, y_train, x_valid, y_valid, cs=None) -> pd.DataFrame:
+    cs = np.sort(LR_CS if cs is None else np.asarray(cs))
+    y_valid = np.asarray(y_valid)
+    model = LogisticRegression(max_iter=1000, random_state=42, warm_start=True)
+
+    rows, start = [], time.perf_counter()
+    for c in cs:
+        model.set_params(C=c).fit(x_train, y_train)
+        rows.append({'model': 'Logistic Regression', 'C': c, 'n_iter': int(model.n_iter_[0]),
+                     **_scores(y_valid, model.predict_proba(x_valid)[:, 1])})
+    table = pd.DataFrame(rows)
+    table.attrs['time'] = time.perf_counter() - start
+    return table
+
+
+def sweep(x_train, y_train, x_valid, y_valid, metric: str = 'roc_auc') -> dict:
+    # обе таблицы + лучшие конфигурации как фабрики для train_models(models=...)
+    knn, lr = knn_sweep(x_train, y_train, x_valid, y_valid), lr_sweep(x_train, y_train, x_valid, y_valid)
+    best_knn, best_lr = knn.loc[knn[metric].idxmax()], lr.loc[lr[metric].idxmax()]
+    k, weights = int(best_knn['k']), best_knn['weights']
+    models = {
+        f"Logistic Regression (C={best_lr['C']:.3g})": partial(LogisticRegression, C=best_lr['C'], max_iter=1000,
+                                                             random_state=42),
+        f"KNN (k={k}, {weights})": partial(KNeighborsClassifier, n_neighbors=k, weights=weights),
+    }
+    return {'knn': knn, 'lr': lr, 'models': models}
+
+
+if __name__ == "__main__":
+    # сверка с KNeighborsClassifier / LogisticRegression по каждой точке сетки и время против обучения по точкам
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(12_000, 8))
+    y = (x[:, 0] + x[:, 1] ** 2 + rng.normal(size=len(x)) > 1).astype(int)
+    # часть строк - точные дубликаты, чтобы проверить ветку d=0 у weights='distance'
+    x[10_000:10_500] = x[:500]
+    x_train, y_train, x_valid, y_valid = x[:10_000], y[:10_000], x[10_000:], y[10_000:]
+
+    knn = knn_sweep(x_train, y_train, x_valid, y_valid)
+    start = time.perf_counter()
+    for row in knn.itertuples():
+        model = KNeighborsClassifier(n_neighbors=row.k, weights=row.weights).fit(x_train, y_train)
+        expected = roc_auc_score(y_valid, model.predict_proba(x_valid)[:, 1])
+        assert np.isclose(row.roc_auc, expected), (row.k, row.weights, row.roc_auc, expected)
+    naive_knn = time.perf_counter() - start
+    print(f"KNN: {len(knn)} конфигураций ({knn.attrs['algorithm']}) за {knn.attrs['time']:.2f} s, "
+          f"по одной: {naive_knn:.2f} s")
+
+    lr = lr_sweep(x_train, y_train, x_valid, y_valid)
+    start = time.perf_counter()
+    cold_iters = []
+    for row in lr.itertuples():
+        model = LogisticRegression(C=row.C, max_iter=1000, random_state=42).fit(x_train, y_train)
+        cold_iters.append(int(model.n_iter_[0]))
+        assert np.isclose(row.roc_auc, roc_auc_score(y_valid, model.predict_proba(x_valid)[:, 1]), atol=1e-4)
+    naive_lr = time.perf_counter() - start
+    print(f"LR: {len(lr)} значений C за {lr.attrs['time']:.2f} s ({lr['n_iter'].sum()} итераций), "
+          f"без warm_start: {naive_lr:.2f} s ({sum(cold_iters)} итераций)")
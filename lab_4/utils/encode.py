@@ -2,6 +2,7 @@ from pathlib import Path
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, RobustScaler
 
@@ -18,13 +19,16 @@ y = df['income']
 num_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
 cat_cols = X.select_dtypes(include=['object', 'string']).columns.tolist()
 
+# one-hot остается CSR (sparse_threshold=1.0 - ColumnTransformer не уплотняет результат);
+# масштаб числовых столбцов прежний - центрирование трогает только их плотный блок, не one-hot.
+# матрица сохраняется в npz: читать через scipy.sparse.load_npz
 preprocessor = ColumnTransformer([
     ('num', StandardScaler(), num_cols),
-    ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=False), cat_cols)
-])
-X_processed = preprocessor.fit_transform(X)
+    ('cat', OneHotEncoder(handle_unknown='ignore', sparse_output=True), cat_cols)
+], sparse_threshold=1.0)
+X_processed = sparse.csr_matrix(preprocessor.fit_transform(X))
 
-np.save('./npy_data/adult/adult_X.npy', X_processed)
+sparse.save_npz('./npy_data/adult/adult_X.npz', X_processed)
 np.save('./npy_data/adult/adult_y.npy', y.values)
 print("Adult saved")
 